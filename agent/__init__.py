@@ -1,13 +1,16 @@
 """Data Science Agent - shared backend components for UI and API layers."""
 
 from .config import DEFAULT_MODEL, build_llm_with_tools
+from .figure_store import load_figure_json
 from .graph import DataScienceGraph
 from .service import (
     AgentSession,
     SUPPORTED_UPLOAD_TYPES,
+    UploadSpool,
     get_figure_identifier,
     get_uploaded_file_signature,
     load_tabular_bytes,
+    load_tabular_file,
     normalize_agent_result,
 )
 
@@ -16,9 +19,12 @@ __all__ = [
     "DEFAULT_MODEL",
     "SUPPORTED_UPLOAD_TYPES",
     "DataScienceGraph",
+    "UploadSpool",
     "build_llm_with_tools",
     "get_figure_identifier",
     "get_uploaded_file_signature",
+    "load_figure_json",
     "load_tabular_bytes",
+    "load_tabular_file",
     "normalize_agent_result",
 ]
@@ -0,0 +1,525 @@
+"""Durable LangGraph checkpointer backed by SQLite, with per-thread compaction."""
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from .config import CHECKPOINT_DB_PATH, CHECKPOINT_KEEP_LATEST, CHECKPOINTER
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+"""
+
+_default_checkpointer = None
+_default_checkpointer_lock = threading.Lock()
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpoint saver that keeps LangGraph state in a SQLite file.
+
+    Channel values are stored once per (channel, version) like InMemorySaver
+    does, so a step that only appends a tool log doesn't rewrite the message
+    list. After every put only the latest `keep_latest` checkpoints of the
+    thread are kept, together with their pending writes and the channel
+    blobs they reference; older ones are deleted, so a long conversation
+    costs a flat amount of disk and nothing in RAM. `keep_latest=0` keeps
+    the full history.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB_PATH,
+        keep_latest: int = CHECKPOINT_KEEP_LATEST,
+        *,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_latest = keep_latest
+        self.compacted = 0
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    # -- helpers -----------------------------------------------------------
+    def _load_blobs(
+        self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions
+    ) -> dict[str, Any]:
+        channel_values = {}
+        for channel, version in versions.items():
+            row = self._db.execute(
+                "SELECT type, value FROM blobs WHERE thread_id = ? AND "
+                "checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is not None and row[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(row)
+        return channel_values
+
+    def _to_tuple(self, row) -> CheckpointTuple:
+        (
+            thread_id,
+            checkpoint_ns,
+            checkpoint_id,
+            parent_checkpoint_id,
+            checkpoint_type,
+            checkpoint_blob,
+            metadata_type,
+            metadata_blob,
+        ) = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        writes = self._db.execute(
+            "SELECT task_id, channel, type, value FROM writes WHERE thread_id = ? "
+            "AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(
+                    thread_id, checkpoint_ns, checkpoint["channel_versions"]
+                ),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def _compact(self, thread_id: str, checkpoint_ns: str):
+        """Drop everything but the latest `keep_latest` checkpoints of a thread."""
+        if not self.keep_latest:
+            return
+
+        stale = [
+            row[0]
+            for row in self._db.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND "
+                "checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?",
+                (thread_id, checkpoint_ns, self.keep_latest),
+            )
+        ]
+        if not stale:
+            return
+
+        key = (thread_id, checkpoint_ns)
+        for checkpoint_id in stale:
+            self._db.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ?",
+                (*key, checkpoint_id),
+            )
+            self._db.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ?",
+                (*key, checkpoint_id),
+            )
+
+        referenced = set()
+        for checkpoint_type, checkpoint_blob in self._db.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND "
+            "checkpoint_ns = ?",
+            key,
+        ).fetchall():
+            checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+            referenced.update(
+                (channel, str(version))
+                for channel, version in checkpoint["channel_versions"].items()
+            )
+        for channel, version in self._db.execute(
+            "SELECT channel, version FROM blobs WHERE thread_id = ? AND "
+            "checkpoint_ns = ?",
+            key,
+        ).fetchall():
+            if (channel, version) not in referenced:
+                self._db.execute(
+                    "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "AND channel = ? AND version = ?",
+                    (*key, channel, version),
+                )
+        self.compacted += len(stale)
+
+    # -- BaseCheckpointSaver -------------------------------------------------
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._db.execute(
+                    columns + " AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._db.execute(
+                    columns + " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+
+            checkpoint_tuple = self._to_tuple(row)
+            if checkpoint_id:
+                # Mirror InMemorySaver: echo the caller's config back unchanged.
+                checkpoint_tuple = checkpoint_tuple._replace(config=config)
+            return checkpoint_tuple
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                checkpoint_tuple = self._to_tuple(row)
+                if filter and not all(
+                    checkpoint_tuple.metadata.get(key) == value
+                    for key, value in filter.items()
+                ):
+                    continue
+                results.append(checkpoint_tuple)
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+
+        blobs = []
+        for channel, version in new_versions.items():
+            value_type, value = (
+                self.serde.dumps_typed(values[channel])
+                if channel in values
+                else ("empty", b"")
+            )
+            blobs.append(
+                (thread_id, checkpoint_ns, channel, str(version), value_type, value)
+            )
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(stored)
+        metadata_type, metadata_blob = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        checkpoint_type,
+                        checkpoint_blob,
+                        metadata_type,
+                        metadata_blob,
+                    ),
+                )
+                self._compact(thread_id, checkpoint_ns)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    value_type,
+                    value_blob,
+                    task_path,
+                )
+            )
+
+        # Special channels (errors, interrupts) overwrite; regular writes of a
+        # task are idempotent, like InMemorySaver.
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            self._db.executemany(
+                f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            for table in ("checkpoints", "writes", "blobs"):
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,)
+                )
+            self._db.execute("COMMIT")
+
+    # SQLite calls are short and serialized by the lock; run them off the
+    # event loop so a busy database never stalls other requests.
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            threads, checkpoints = self._db.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+            ).fetchone()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "keep_latest": self.keep_latest,
+            "compacted": self.compacted,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def get_default_checkpointer() -> SQLiteCheckpointSaver:
+    """Process-wide SQLite checkpointer shared by every session (one connection)."""
+    global _default_checkpointer
+    with _default_checkpointer_lock:
+        if _default_checkpointer is None:
+            _default_checkpointer = SQLiteCheckpointSaver()
+        return _default_checkpointer
+
+
+def _serialized_bytes(value) -> int:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_serialized_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_serialized_bytes(item) for item in value.values())
+    return 0
+
+
+def thread_memory_bytes(checkpointer, thread_id: str) -> int:
+    """
+    Bytes of serialized state a checkpointer holds in RAM for one thread.
+
+    MemorySaver keeps every checkpoint, pending write and channel blob of a
+    conversation; the SQLite checkpointer keeps them on disk, so it counts 0.
+    """
+    if not isinstance(checkpointer, MemorySaver):
+        return 0
+    total = _serialized_bytes(checkpointer.storage.get(thread_id, {}))
+    total += sum(
+        _serialized_bytes(writes)
+        for key, writes in list(checkpointer.writes.items())
+        if key[0] == thread_id
+    )
+    total += sum(
+        _serialized_bytes(blob)
+        for key, blob in list(checkpointer.blobs.items())
+        if key[0] == thread_id
+    )
+    return total
+
+
+def build_checkpointer(backend: str = CHECKPOINTER):
+    """Checkpointer for a new session: its own MemorySaver, or the shared SQLite one."""
+    if backend == "memory":
+        return MemorySaver()
+    if backend == "sqlite":
+        return get_default_checkpointer()
+    raise ValueError(
+        f"Unknown checkpointer backend '{backend}'. Choose one of: memory, sqlite"
+    )
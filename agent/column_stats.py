@@ -0,0 +1,330 @@
+"""Lazily computed, memoized column statistics for an uploaded dataset."""
+
+import ast
+import sys
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, Optional
+
+import pandas as pd
+
+from .config import COLUMN_STATS_MAX_BYTES
+from .helpers import _isolated_frame, _make_json_safe
+
+# Methods of ColumnStats that python_repl code calls as df_stats.<method>(...).
+STAT_METHODS = ("describe", "value_counts", "nunique", "isna_sum")
+
+# Value counts with more distinct values than this share of the rows (and at
+# least _MIN_UNCACHED_VALUES of them) are as large as the column itself and
+# are recomputed on request instead of cached.
+_NEAR_UNIQUE_RATIO = 0.5
+_MIN_UNCACHED_VALUES = 10_000
+
+
+def _result_bytes(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    return sys.getsizeof(value)
+
+
+def _isolated(value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return _isolated_frame(value)
+    return value
+
+
+def referenced_stats(code: str, name: str = "df_stats") -> set[tuple] | None:
+    """
+    Statistics a code string asks for as `df_stats.<method>("column", ...)`.
+
+    Returns (method, column) pairs, column None meaning every column the
+    method covers by default; returns None when `df_stats` is used any other
+    way (a computed column, passed around), meaning anything may be needed.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+
+    requests = set()
+    calls = set()
+    for node in ast.walk(tree):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id == name
+        ):
+            continue
+        if node.func.attr not in STAT_METHODS:
+            return None
+        column_arg = node.args[0] if node.args else None
+        for keyword in node.keywords:
+            if keyword.arg == "column":
+                column_arg = keyword.value
+            elif keyword.arg is None:
+                return None
+        if column_arg is None:
+            requests.add((node.func.attr, None))
+        elif isinstance(column_arg, ast.Constant):
+            requests.add((node.func.attr, column_arg.value))
+        else:
+            return None
+        calls.add(id(node.func.value))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == name and id(node) not in calls:
+            return None
+    return requests
+
+
+class ColumnStats:
+    """
+    Memoized describe / value_counts / nunique / isna().sum() for one frame.
+
+    One instance lives with each dataset cache entry (keyed by the upload's
+    SHA-256), so the statistics are shared by every session using that
+    upload and survive across tool calls and turns. Each statistic is
+    computed per column on first request; asking for the whole frame only
+    computes the columns not seen before. The frame is never modified, so
+    cached results stay valid for the lifetime of the entry. Results are
+    kept within `max_bytes`, least recently used dropped first, and value
+    counts of near-unique columns are not kept at all.
+
+    python_repl sees it as `df_stats`; results are copy-on-write copies, so
+    code may modify them freely.
+    """
+
+    def __init__(
+        self, df: Optional[pd.DataFrame], max_bytes: int = COLUMN_STATS_MAX_BYTES
+    ):
+        self._df = df
+        self.max_bytes = max_bytes
+        self._results: OrderedDict[tuple, object] = OrderedDict()
+        self._sizes: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self) -> str:
+        return (
+            "<df_stats: cached describe/value_counts/nunique/isna_sum of df; "
+            f"{len(self._results)} results computed>"
+        )
+
+    def _column(self, column: Hashable) -> pd.Series:
+        if self._df is None:
+            raise RuntimeError("df_stats has no frame attached")
+        if column not in self._df.columns:
+            raise KeyError(f"No column named {column!r}")
+        return self._df[column]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the cached results."""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def _store(self, key: tuple, value, size: int):
+        # Called with the lock held.
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        self._results[key] = value
+        self._sizes[key] = size
+        if self.max_bytes:
+            total = sum(self._sizes.values())
+            while total > self.max_bytes and len(self._results) > 1:
+                oldest, _ = self._results.popitem(last=False)
+                total -= self._sizes.pop(oldest)
+                self.evictions += 1
+        return value
+
+    def _get(self, key: tuple, compute, keep=None):
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+        value = compute()
+        size = _result_bytes(value)
+        with self._lock:
+            self.misses += 1
+            if keep is not None and not keep(value):
+                return value
+            return self._store(key, value, size)
+
+    def _value_counts(self, column: Hashable, dropna: bool) -> pd.Series:
+        def keep(counts: pd.Series) -> bool:
+            if len(counts) <= max(
+                _MIN_UNCACHED_VALUES, _NEAR_UNIQUE_RATIO * len(self._df)
+            ):
+                return True
+            # Too big to keep, but the cardinality comes for free.
+            unique = int((counts > 0).sum())
+            self._store(("nunique", column, dropna), unique, _result_bytes(unique))
+            return False
+
+        return self._get(
+            ("value_counts", column, dropna),
+            lambda: self._column(column).value_counts(dropna=dropna),
+            keep=keep,
+        )
+
+    def _nunique(self, column: Hashable, dropna: bool) -> int:
+        def compute():
+            # Reuse cached value counts when they exist; same scan otherwise.
+            with self._lock:
+                counts = self._results.get(("value_counts", column, dropna))
+            if counts is not None:
+                return int((counts > 0).sum())
+            return int(self._column(column).nunique(dropna=dropna))
+
+        return self._get(("nunique", column, dropna), compute)
+
+    def _describe(self, column: Hashable) -> pd.Series:
+        return self._get(("describe", column), lambda: self._column(column).describe())
+
+    def _isna_sum(self, column: Hashable) -> int:
+        return self._get(
+            ("isna_sum", column), lambda: int(self._column(column).isna().sum())
+        )
+
+    def _default_describe_columns(self) -> list:
+        # Same default as DataFrame.describe(): numeric columns if any.
+        numeric = self._df.select_dtypes(include="number").columns
+        return list(numeric if len(numeric) else self._df.columns)
+
+    def describe(self, column: Optional[Hashable] = None):
+        """`df[column].describe()`, or `df.describe()` without a column."""
+        if column is not None:
+            return _isolated(self._describe(column))
+        columns = self._default_describe_columns()
+        return pd.concat(
+            {name: self._describe(name) for name in columns}, axis=1, sort=False
+        ).reindex(columns=columns)
+
+    def value_counts(
+        self, column: Hashable, normalize: bool = False, dropna: bool = True
+    ) -> pd.Series:
+        """`df[column].value_counts(normalize=..., dropna=...)`."""
+        counts = self._value_counts(column, dropna)
+        if normalize:
+            return (counts / counts.sum()).rename("proportion")
+        return _isolated(counts)
+
+    def nunique(self, column: Optional[Hashable] = None, dropna: bool = True):
+        """`df[column].nunique()`, or `df.nunique()` without a column."""
+        if column is not None:
+            return self._nunique(column, dropna)
+        return pd.Series(
+            {name: self._nunique(name, dropna) for name in self._df.columns},
+            dtype="int64",
+        )
+
+    def isna_sum(self, column: Optional[Hashable] = None):
+        """`df[column].isna().sum()`, or `df.isna().sum()` without a column."""
+        if column is not None:
+            return self._isna_sum(column)
+        return pd.Series(
+            {name: self._isna_sum(name) for name in self._df.columns}, dtype="int64"
+        )
+
+    def warm(self, requests: Iterable[tuple]):
+        """Compute (method, column) pairs ahead of time, e.g. from referenced_stats."""
+        for method, column in requests:
+            if column is None and method == "value_counts":
+                continue  # needs a column; the call itself will fail
+            try:
+                getattr(self, method)(column)
+            except Exception:
+                pass  # raised again where the code makes the call
+
+    def _detached(self, requests: Optional[set[tuple]]) -> "ColumnStats":
+        # Only the results the code asks for, so large value counts aren't
+        # pickled into every worker call that doesn't use them.
+        detached = ColumnStats(None, max_bytes=0)
+        with self._lock:
+            for key, value in self._results.items():
+                if requests is None or any(
+                    key[0] == method and (column is None or key[1] == column)
+                    for method, column in requests
+                ):
+                    detached._results[key] = value
+                    detached._sizes[key] = self._sizes[key]
+        return detached
+
+    def with_frame(self, df: pd.DataFrame) -> "ColumnStats":
+        """Attach the frame to compute misses on (worker side of a pickled copy)."""
+        self._df = df
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_df"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def for_execution(self, code: str, portable: bool = False):
+        """
+        What python_repl binds to `df_stats` for one run of `code`.
+
+        Worker processes can't reach this cache, so `portable` computes the
+        statistics the code names here first (kept for later calls) and ships
+        just those results; the worker computes anything else on its own
+        copy of the frame.
+        """
+        if not portable:
+            return self
+        requests = referenced_stats(code)
+        if requests is not None:
+            self.warm(requests)
+        return self._detached(requests)
+
+    def summary(self, columns: Optional[list] = None, top: int = 10) -> dict:
+        """JSON-ready statistics per column, computing whatever is missing."""
+        summary = {}
+        for name in columns or list(self._df.columns):
+            column = self._column(name)
+            entry = {
+                "dtype": str(column.dtype),
+                "nulls": self._isna_sum(name),
+                "unique": None,
+                "describe": None,
+                "top_values": None,
+            }
+            try:
+                if pd.api.types.is_numeric_dtype(
+                    column
+                ) and not pd.api.types.is_bool_dtype(column):
+                    entry["unique"] = self._nunique(name, True)
+                    entry["describe"] = _make_json_safe(self._describe(name).to_dict())
+                else:
+                    counts = self._value_counts(name, True)
+                    entry["unique"] = self._nunique(name, True)
+                    entry["top_values"] = [
+                        {"value": str(value), "count": int(count)}
+                        for value, count in counts.head(top).items()
+                    ]
+            except TypeError:
+                pass  # unhashable values
+            summary[str(name)] = entry
+        return summary
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "results": len(self._results),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,125 @@
+"""Shrink uploaded DataFrames by choosing tighter dtypes after parsing."""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .config import COMPACT_CATEGORY_MAX_RATIO, COMPACT_NUMBERS
+
+# Values must look like ISO dates (2024-01-31, 2024/01/31 13:45, ...) before a
+# column is parsed as datetimes, so ids and codes are never misread as dates.
+_ISO_DATE = re.compile(r"^\d{4}[-/]\d{1,2}[-/]\d{1,2}([ T]\d{1,2}:\d{2}(:\d{2})?.*)?$")
+_DATE_SAMPLE_SIZE = 200
+
+
+def _column_bytes(column: pd.Series) -> int:
+    return int(column.memory_usage(deep=True, index=False))
+
+
+def _as_datetime(column: pd.Series) -> pd.Series | None:
+    sample = column.dropna().head(_DATE_SAMPLE_SIZE)
+    if sample.empty or not all(_ISO_DATE.match(str(value)) for value in sample):
+        return None
+    parsed = pd.to_datetime(column, errors="coerce", format="mixed")
+    # Reject the column if parsing would silently drop values.
+    if parsed.isna().sum() != column.isna().sum():
+        return None
+    return parsed
+
+
+def _compact_strings(column: pd.Series, category_max_ratio: float) -> pd.Series:
+    if pd.api.types.infer_dtype(column, skipna=True) != "string":
+        return column
+
+    parsed = _as_datetime(column)
+    if parsed is not None:
+        return parsed
+
+    non_null = column.count()
+    if non_null and column.nunique() / non_null <= category_max_ratio:
+        return column.astype("category")
+    return column.astype("string[pyarrow]")
+
+
+def _compact_numbers(column: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(column):
+        return column
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast="integer")
+    if pd.api.types.is_float_dtype(column):
+        downcast = column.astype(np.float32)
+        # Only keep float32 when it round-trips exactly; analysis results
+        # must not change because of compaction.
+        if np.array_equal(
+            downcast.to_numpy(np.float64), column.to_numpy(np.float64), equal_nan=True
+        ):
+            return downcast
+    return column
+
+
+def compact_dtypes(
+    df: pd.DataFrame,
+    category_max_ratio: float = COMPACT_CATEGORY_MAX_RATIO,
+    numbers: bool = COMPACT_NUMBERS,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Convert columns to the smallest dtype that keeps their values.
+
+    Low-cardinality strings become `category`, other strings Arrow-backed
+    `string[pyarrow]` and ISO-formatted date strings `datetime64`. With
+    `numbers`, integers and exactly representable floats are downcast too;
+    that keeps values but not the results of arithmetic on them (int8
+    products overflow), so it is off unless COMPACT_NUMBERS opts in. A
+    conversion is only kept if it makes the column smaller.
+
+    Args:
+        df: The freshly loaded DataFrame (not modified)
+        category_max_ratio: Highest unique/non-null ratio for a string
+            column to become categorical
+        numbers: Also downcast integer and float columns
+
+    Returns:
+        The compacted DataFrame and a report with bytes before/after and
+        the dtype change of every converted column
+    """
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    columns = {}
+    changes = {}
+
+    for position, (name, column) in enumerate(df.items()):
+        if column.dtype == object:
+            compacted = _compact_strings(column, category_max_ratio)
+        elif (
+            numbers
+            and pd.api.types.is_numeric_dtype(column)
+            and isinstance(column.dtype, np.dtype)
+        ):
+            compacted = _compact_numbers(column)
+        else:
+            compacted = column
+
+        if compacted is not column and (
+            pd.api.types.is_datetime64_any_dtype(compacted)
+            or _column_bytes(compacted) < _column_bytes(column)
+        ):
+            columns[position] = compacted
+            changes[str(name)] = f"{column.dtype} -> {compacted.dtype}"
+        else:
+            columns[position] = column
+
+    if not changes:
+        return df, {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_before,
+            "columns": {},
+        }
+
+    compacted_df = pd.concat(columns, axis=1)
+    compacted_df.columns = df.columns
+    bytes_after = int(compacted_df.memory_usage(deep=True).sum())
+    return compacted_df, {
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "columns": changes,
+    }
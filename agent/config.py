@@ -1,4 +1,5 @@
 import operator
+import os
 from typing import Annotated, Dict, List
 
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -7,6 +8,156 @@ from langgraph.graph import MessagesState
 DEFAULT_MODEL = "gemini-3.1-flash-lite-preview"
 
 
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+# Hand python_repl a copy-on-write view of the session DataFrame instead of a
+# deep copy per tool call. Set REPL_COPY_ON_WRITE=0 to restore df.copy().
+REPL_COPY_ON_WRITE = _env_flag("REPL_COPY_ON_WRITE", True)
+
+# Opt-in: keep variables the model defines in python_repl alive across tool
+# calls and turns, bounded by an LRU byte budget per session.
+REPL_PERSISTENT_NAMESPACE = _env_flag("REPL_PERSISTENT_NAMESPACE", False)
+REPL_NAMESPACE_MAX_BYTES = int(
+    os.getenv("REPL_NAMESPACE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+# Where python_repl code runs: "in-process" (the request thread) or
+# "process-pool" (pre-warmed worker processes sharing the DataFrame).
+REPL_EXECUTOR = os.getenv("REPL_EXECUTOR", "in-process")
+REPL_POOL_WORKERS = int(os.getenv("REPL_POOL_WORKERS", str(os.cpu_count() or 1)))
+
+# Opt-in: answer byte-identical, deterministic python_repl code on an unchanged
+# dataset and namespace from a process-wide LRU cache of earlier results.
+REPL_MEMO = _env_flag("REPL_MEMO", False)
+REPL_MEMO_MAX_BYTES = int(os.getenv("REPL_MEMO_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Per-call python_repl limits; 0 disables a limit. The memory limit is RSS
+# growth during the call (process-wide for the in-process executor).
+REPL_WALL_TIMEOUT_SECONDS = float(os.getenv("REPL_WALL_TIMEOUT_SECONDS", "120"))
+REPL_CPU_TIME_LIMIT_SECONDS = float(os.getenv("REPL_CPU_TIME_LIMIT_SECONDS", "90"))
+REPL_MEMORY_LIMIT_MB = int(os.getenv("REPL_MEMORY_LIMIT_MB", "2048"))
+
+# Profile uploads once (schema, nulls, cardinalities, numeric summaries and
+# sample rows) and hand it to the model with the first question, so it can
+# skip the inspection tool call. Columns past PROFILE_MAX_COLUMNS are listed
+# by name only.
+DATASET_PROFILE = _env_flag("DATASET_PROFILE", True)
+PROFILE_MAX_COLUMNS = int(os.getenv("PROFILE_MAX_COLUMNS", "50"))
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "5"))
+
+# Point budget per captured Plotly figure (0 disables). Larger figures are
+# reduced before serialization: line traces keep per-bucket minima and
+# maxima, scatters a random sample, and histograms are binned server-side.
+FIGURE_MAX_POINTS = int(os.getenv("FIGURE_MAX_POINTS", "100000"))
+
+# Encode numeric figure arrays as base64 typed arrays ({"dtype", "bdata"},
+# read by plotly.js >= 2.28 / plotly.py >= 6) instead of JSON number lists.
+FIGURE_TYPED_ARRAYS = _env_flag("FIGURE_TYPED_ARRAYS", True)
+
+# Rows of a sql_query result shown to the model; the rest are summarized.
+SQL_QUERY_MAX_ROWS = int(os.getenv("SQL_QUERY_MAX_ROWS", "200"))
+# Rows of a sql_query result bound to `sql_result` in a persistent namespace
+# (0 binds them all); only this many are ever fetched from DuckDB.
+SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "1000000"))
+
+# Run the independent tool calls of one agent step concurrently.
+PARALLEL_TOOL_CALLS = _env_flag("PARALLEL_TOOL_CALLS", True)
+PARALLEL_TOOL_CALLS_MAX_WORKERS = int(os.getenv("PARALLEL_TOOL_CALLS_MAX_WORKERS", "4"))
+
+# API session store limits; idle sessions expire and the least recently used
+# ones are evicted once the count or byte budget is exceeded (0 disables).
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "100"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(4 * 1024**3)))
+
+# CSV_ENGINE=pyarrow parses CSV uploads with Arrow's multithreaded reader
+# (falls back to the C parser on files it rejects). ARROW_DTYPES keeps
+# uploads in Arrow-backed dtypes instead of NumPy/object columns.
+CSV_ENGINE = os.getenv("CSV_ENGINE", "c")
+ARROW_DTYPES = _env_flag("ARROW_DTYPES", False)
+
+# COMPACT_DTYPES shrinks uploads after parsing: low-cardinality strings (at
+# most COMPACT_CATEGORY_MAX_RATIO unique values per row) become categories,
+# other strings Arrow strings and ISO dates datetimes.
+COMPACT_DTYPES = _env_flag("COMPACT_DTYPES", False)
+COMPACT_CATEGORY_MAX_RATIO = float(os.getenv("COMPACT_CATEGORY_MAX_RATIO", "0.5"))
+# COMPACT_NUMBERS also downcasts integers (int8/16/32) and exactly
+# representable floats (float32). Values are kept, but arithmetic on them
+# happens in the narrow dtype: qty * price on int8 columns wraps around and
+# float32 sums lose precision. Only for datasets the code won't compute on.
+COMPACT_NUMBERS = _env_flag("COMPACT_NUMBERS", False)
+
+# Uploads are streamed to a spool file in UPLOAD_CHUNK_BYTES chunks (the
+# system temp directory when UPLOAD_SPOOL_DIR is unset) and parsed from disk.
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+# Parsed uploads are shared between sessions by SHA-256. Frames no session
+# references stay cached for re-uploads until this budget is exceeded.
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(2 * 1024**3)))
+# Memory for the cached `df_stats` results of one upload; least recently used
+# results are dropped beyond it (0 keeps all). Counted in the entry's size.
+COLUMN_STATS_MAX_BYTES = int(os.getenv("COLUMN_STATS_MAX_BYTES", str(64 * 1024**2)))
+
+# Uploads of at least OUT_OF_CORE_THRESHOLD_BYTES (0 disables) are stored as
+# partitioned Parquet under OUT_OF_CORE_DIR and queried through DuckDB, with a
+# random sample of OUT_OF_CORE_SAMPLE_ROWS rows as `df`.
+OUT_OF_CORE_THRESHOLD_BYTES = int(
+    os.getenv("OUT_OF_CORE_THRESHOLD_BYTES", str(1024**3))
+)
+OUT_OF_CORE_SAMPLE_ROWS = int(os.getenv("OUT_OF_CORE_SAMPLE_ROWS", "100000"))
+OUT_OF_CORE_ROWS_PER_FILE = int(os.getenv("OUT_OF_CORE_ROWS_PER_FILE", "5000000"))
+OUT_OF_CORE_MEMORY_LIMIT_MB = int(
+    os.getenv("OUT_OF_CORE_MEMORY_LIMIT_MB", str(max(REPL_MEMORY_LIMIT_MB // 2, 256)))
+)
+
+# JSON API responses of at least RESPONSE_COMPRESSION_MIN_BYTES are sent
+# brotli- (when the brotli package is installed) or gzip-compressed to
+# clients that accept it (0 disables).
+RESPONSE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")
+)
+
+# "memory" keeps sessions in this process; "sqlite" shares them between
+# uvicorn workers/containers through SESSION_STORE_DIR.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_DIR = os.getenv("SESSION_STORE_DIR", ".sessions")
+# Secret used to encrypt API keys in the SQLite session store. Without it
+# keys are never written to disk, and a worker that rehydrates a session
+# needs the key set again (POST /sessions/{id}/api-key).
+SESSION_SECRET = os.getenv("SESSION_SECRET") or None
+OUT_OF_CORE_DIR = os.getenv(
+    "OUT_OF_CORE_DIR", os.path.join(SESSION_STORE_DIR, "out_of_core")
+)
+# Converted datasets under OUT_OF_CORE_DIR are deleted least recently used
+# first once they take more than this many bytes (0 keeps all).
+OUT_OF_CORE_MAX_BYTES = int(os.getenv("OUT_OF_CORE_MAX_BYTES", str(50 * 1024**3)))
+
+# Captured figures are written gzip-compressed to a content-addressed store
+# under FIGURE_STORE_DIR; sessions, tool results and API responses then carry
+# only references, and clients fetch the JSON from the figure endpoint. The
+# least recently read files are deleted beyond FIGURE_STORE_MAX_BYTES.
+FIGURE_STORE = _env_flag("FIGURE_STORE", True)
+FIGURE_STORE_DIR = os.getenv(
+    "FIGURE_STORE_DIR", os.path.join(SESSION_STORE_DIR, "figures")
+)
+FIGURE_STORE_MAX_BYTES = int(os.getenv("FIGURE_STORE_MAX_BYTES", str(1024**3)))
+
+# "memory" gives each session its own MemorySaver; "sqlite" keeps LangGraph
+# checkpoints on disk so conversations survive restarts. Only the latest
+# CHECKPOINT_KEEP_LATEST checkpoints per thread are kept (0 keeps all).
+CHECKPOINTER = os.getenv("CHECKPOINTER", "memory")
+CHECKPOINT_DB_PATH = os.getenv(
+    "CHECKPOINT_DB_PATH", os.path.join(SESSION_STORE_DIR, "checkpoints.db")
+)
+CHECKPOINT_KEEP_LATEST = int(os.getenv("CHECKPOINT_KEEP_LATEST", "5"))
+
+
 def add_tool_results(left: list[dict] | None, right: list[dict] | None) -> list[dict]:
     """Custom reducer for tool_results. If right is None, clears the list."""
     if right is None:
@@ -21,14 +172,17 @@ class MessagesStateWithTools(MessagesState):
 
 
 system_message = """
-You are an advanced AI assistant equipped with tools, including a Python execution tool called `python_repl`.
+You are an advanced AI assistant equipped with tools: a Python execution tool called `python_repl` and a SQL tool called `sql_query`.
 The pandas dataframe is called `df` and is already provided for you to work on.
+`sql_query` runs DuckDB SQL over the same data without copying it: `df` is a table (e.g. `SELECT region, AVG(price) FROM df GROUP BY region`), and so is each workbook sheet under its name and, for very large uploads, `data`. Prefer `sql_query` for filtering, grouping, joining, counting and aggregating; use `python_repl` for plotting, modelling and anything SQL can't express.
+`df_stats` caches common summaries of `df`, so repeat them through it instead of rescanning: `df_stats.describe()`, `df_stats.describe("col")`, `df_stats.value_counts("col")` (also `normalize=True`), `df_stats.nunique()` / `df_stats.nunique("col")`, and `df_stats.isna_sum()` / `df_stats.isna_sum("col")` return the same results as the pandas calls.
+When the upload is an Excel workbook, `df` is its first sheet and `sheets` maps every sheet name to its DataFrame (e.g. `sheets["Q3"]`); sheets are parsed on first access, so only read the ones you need. `print(list(sheets))` lists them.
 
 You are speaking to a client, so keep explanations clear, direct, and easy to understand.
 Always produce a final user-facing response after all tool calls are executed and their results are received.
 
 ## TOOL CALL RULES (CRITICAL)
-1. When you need to execute Python code, you MUST call the `python_repl` tool.
+1. When you need to execute Python code, you MUST call the `python_repl` tool. When a SQL query answers the question, call `sql_query` with {"query": "<SQL>", "thoughts": "<brief internal intention>"} instead.
 2. The arguments for `python_repl` must follow this shape:
    {"code": "<python code>", "thoughts": "<brief internal intention>"}
 3. After producing a tool call, you MUST wait for the tool result message before producing any user-facing content.
@@ -36,12 +190,12 @@ Always produce a final user-facing response after all tool calls are executed an
 5. NEVER respond with only text when the user asks you to do something with the data. Always call the tool FIRST, then explain results AFTER.
 6. Do NOT say things like "I can help with that! Let me inspect the data first" — just call the tool immediately without preamble.
 
-- Use as many tool calls as needed to inspect the dataframe and complete the analysis.
-- On the VERY FIRST message of a session, your FIRST tool call must ONLY inspect the dataframe: `print(df.columns.tolist())`, `print(df.dtypes)`, `print(df.shape)`, `print(df.head())`. Do NOT include any analysis or plotting code in this inspection call.
-- After receiving the inspection results, make a SEPARATE tool call for the actual analysis or figure generation using the real column names you just discovered. Never guess or assume column names.
-- Do not repeat the same introductory inspection summary on every turn.
+- Use as many tool calls as needed to complete the analysis.
+- The first message of a session usually starts with a `[Dataset profile]` block computed at upload: row and column counts, every column's dtype, null count, number of unique values and a summary, plus the first rows. Treat it as the result of inspecting `df`: do NOT make an inspection call, go straight to the analysis using the exact column names it lists.
+- Only if there is no dataset profile, your FIRST tool call must ONLY inspect the dataframe: `print(df.columns.tolist())`, `print(df.dtypes)`, `print(df.shape)`, `print(df.head())`, and the analysis follows in a SEPARATE tool call. Never guess or assume column names.
+- Do not repeat the same introductory data summary on every turn.
 - To see code output, use `print()` statements. Outputs of `pd.head()`, `pd.describe()`, and similar expressions may not appear unless printed.
-- After inspection, use the exact column names discovered from the dataframe.
+- Use the exact column names from the dataset profile or your inspection.
 - Do not invent missing columns. If the needed column does not exist, tell the user clearly.
 - If multiple columns could reasonably satisfy the request, choose the most relevant one and explain the choice briefly.
 - You may take initiative and perform useful follow-up analysis without asking for permission, as long as it is supported by the data.
@@ -77,7 +231,9 @@ python_repl_schema = {
     "name": "python_repl",
     "description": (
         "Execute Python code for data analysis and visualization. "
-        "The code may read a pre-populated DataFrame called `df`. "
+        "The code may read a pre-populated DataFrame called `df`, cached "
+        "summaries of it through `df_stats`, and for Excel workbooks a mapping "
+        "`sheets` of sheet name to DataFrame. "
         "If you create Plotly figures, append them to the list `plotly_figures` "
         "so the execution environment can capture them. "
         "If you want to return a value, assign it to the variable `result`."
@@ -99,9 +255,36 @@ python_repl_schema = {
 }
 
 
+sql_query_schema = {
+    "name": "sql_query",
+    "description": (
+        "Run a read-only DuckDB SQL query over the uploaded data and return the "
+        "result table. The DataFrame is the table `df`; Excel sheets are tables "
+        "named after the sheet, and very large uploads are the table `data`. "
+        "Use it for filters, group-bys, joins and aggregations."
+    ),
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "A single DuckDB SQL SELECT statement.",
+            },
+            "thoughts": {
+                "type": "string",
+                "description": "Optional: agent's private reasoning or intent (not shown to user).",
+            },
+        },
+        "required": ["query"],
+    },
+}
+
+TOOL_SCHEMAS = [python_repl_schema, sql_query_schema]
+
+
 def build_llm_with_tools(api_key: str, model: str = DEFAULT_MODEL):
     if not api_key:
         raise ValueError("API key is empty")
 
     llm = ChatGoogleGenerativeAI(model=model, google_api_key=api_key)
-    return llm.bind_tools([python_repl_schema])
+    return llm.bind_tools(TOOL_SCHEMAS)
@@ -0,0 +1,206 @@
+"""Process-wide, content-addressed cache of parsed uploads shared by sessions."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+import pandas as pd
+
+from .config import DATASET_CACHE_MAX_BYTES
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+@dataclass
+class _CachedDataset:
+    df: pd.DataFrame
+    bytes: int
+    info: dict = field(default_factory=dict)
+    refs: int = 0
+    last_access: float = field(default_factory=time.monotonic)
+
+    @property
+    def total_bytes(self) -> int:
+        # Workbook sheets parsed and statistics computed after the upload
+        # grow the entry.
+        return self.bytes + sum(
+            self.info[name].nbytes
+            for name in ("sheets", "stats")
+            if self.info.get(name) is not None
+        )
+
+
+class DatasetCache:
+    """
+    Parsed DataFrames keyed by the SHA-256 of the uploaded file.
+
+    The first session to upload a file parses it; later sessions uploading the
+    same bytes get the same frame back without parsing. Sessions treat the
+    frame as read-only: python_repl only ever sees an isolated copy (a
+    copy-on-write view, or a deep copy when REPL_COPY_ON_WRITE is off).
+
+    Each acquire() must be paired with a release(), or with release_later()
+    from a finalizer (a Streamlit session simply goes away when its browser
+    tab closes). Frames still referenced by a session are never evicted; unreferenced ones stay warm for re-uploads
+    until the cache exceeds `max_bytes`, then go least recently used first.
+    """
+
+    def __init__(self, max_bytes: int = DATASET_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, _CachedDataset] = OrderedDict()
+        self._loading: dict[str, threading.Lock] = {}
+        self._pending_releases: deque[str] = deque()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.total_bytes for entry in self._entries.values())
+
+    def _checkout(self, key: str) -> _CachedDataset | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refs += 1
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+        return entry
+
+    def acquire(
+        self, key: str, loader: Callable[[], tuple[pd.DataFrame, dict]]
+    ) -> tuple[pd.DataFrame, int, dict]:
+        """
+        Return the frame for `key`, parsing it with `loader` on a miss.
+
+        Concurrent uploads of the same file wait for a single parse.
+
+        Args:
+            key: SHA-256 of the uploaded file
+            loader: Returns the parsed DataFrame and a dict of load details
+                (e.g. the dtype compaction report) kept with the entry
+
+        Returns:
+            The shared DataFrame, its deep memory usage in bytes and the
+            loader's details
+        """
+        with self._lock:
+            entry = self._checkout(key)
+            if entry is not None:
+                self.hits += 1
+                return entry.df, entry.bytes, entry.info
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._checkout(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.df, entry.bytes, entry.info
+
+            try:
+                df, info = loader()
+                size = int(df.memory_usage(deep=True).sum())
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            # Publish the entry before dropping the key lock, so a caller
+            # that missed it above finds it rather than loading again.
+            with self._lock:
+                self.misses += 1
+                entry = self._checkout(key)
+                if entry is None:
+                    self._entries[key] = entry = _CachedDataset(
+                        df=df, bytes=size, info=info, refs=1
+                    )
+                self._loading.pop(key, None)
+                self._evict()
+            return entry.df, entry.bytes, entry.info
+
+    def share_bytes(self, key: str) -> int:
+        """
+        Bytes of an entry charged to each session holding it.
+
+        A shared frame is split evenly between its holders, so N sessions on
+        one upload count it once in total.
+        """
+        with self._lock:
+            self._drain_releases()
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0
+            return entry.bytes // max(entry.refs, 1)
+
+    def release(self, key: str):
+        with self._lock:
+            self._release(key)
+            self._evict()
+
+    def release_later(self, key: str):
+        """
+        Queue a release() for the next cache operation.
+
+        Safe to call from a finalizer or garbage collection, which may run
+        while this thread is inside the cache.
+        """
+        self._pending_releases.append(key)
+
+    def _release(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refs = max(entry.refs - 1, 0)
+
+    def _drain_releases(self):
+        while self._pending_releases:
+            self._release(self._pending_releases.popleft())
+
+    def _evict(self):
+        self._drain_releases()
+        if not self.max_bytes:
+            return
+        total = self.total_bytes
+        for key in [key for key, entry in self._entries.items() if not entry.refs]:
+            if total <= self.max_bytes:
+                break
+            total -= self._entries.pop(key).total_bytes
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._drain_releases()
+            return {
+                "datasets": len(self._entries),
+                "referenced": sum(1 for e in self._entries.values() if e.refs),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_dataset_cache() -> DatasetCache:
+    """Process-wide dataset cache shared by every session."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = DatasetCache()
+        return _default_cache
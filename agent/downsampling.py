@@ -0,0 +1,369 @@
+"""Keep captured Plotly figures within a point budget before serialization."""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import FIGURE_MAX_POINTS
+
+# Trace types whose points can be subsampled independently of each other.
+_SCATTER_TYPES = frozenset(
+    {
+        "scatter",
+        "scattergl",
+        "scatter3d",
+        "scattergeo",
+        "scattermap",
+        "scattermapbox",
+        "scatterpolar",
+        "scatterpolargl",
+        "scatterternary",
+    }
+)
+_LINE_TYPES = frozenset({"scatter", "scattergl"})
+
+# Coordinates that define a trace's point count.
+_COORDINATE_KEYS = ("x", "y", "z", "lat", "lon", "r", "theta", "a", "b", "c")
+
+# Histogram settings with no bar equivalent once the counts are computed.
+_HISTOGRAM_ONLY_KEYS = frozenset(
+    {
+        "type",
+        "x",
+        "y",
+        "nbinsx",
+        "nbinsy",
+        "xbins",
+        "ybins",
+        "autobinx",
+        "autobiny",
+        "bingroup",
+        "histfunc",
+        "histnorm",
+        "cumulative",
+    }
+)
+_MAX_AUTO_BINS = 500
+
+_SEED = 0
+
+
+def _is_array(value) -> bool:
+    return isinstance(value, (np.ndarray, list, tuple, pd.Series, pd.Index))
+
+
+def _trace_points(trace: dict) -> int:
+    return max(
+        (len(trace[key]) for key in _COORDINATE_KEYS if _is_array(trace.get(key))),
+        default=0,
+    )
+
+
+def _take(props: dict, indices: np.ndarray, points: int) -> dict:
+    """Copy of `props` with every per-point array reduced to `indices`."""
+    taken = {}
+    for key, value in props.items():
+        if isinstance(value, dict):
+            taken[key] = _take(value, indices, points)
+        elif _is_array(value) and len(value) == points:
+            taken[key] = np.asarray(value)[indices]
+        else:
+            taken[key] = value
+    return taken
+
+
+def _numeric(values) -> Optional[np.ndarray]:
+    array = np.asarray(values)
+    if array.dtype.kind in "biuf":
+        return array.astype(np.float64, copy=False)
+    if array.dtype.kind == "M":
+        return array.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return None
+
+
+def min_max_indices(values: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Indices of each bucket's minimum and maximum (plus both end points).
+
+    Splitting the series into equal-count buckets and keeping their extremes
+    preserves every peak and trough a chart at screen resolution can show,
+    which uniform striding would drop. Fully vectorized.
+    """
+    points = len(values)
+    bucket_size = -(-points // buckets)
+    padded = np.full(buckets * bucket_size, np.nan)
+    padded[:points] = values
+    padded = padded.reshape(buckets, bucket_size)
+    offsets = np.arange(buckets) * bucket_size
+
+    # All-NaN buckets (gaps) resolve to their first point; +/-inf keeps NaN
+    # from winning the comparison elsewhere.
+    lows = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.concatenate(([0, points - 1], lows, highs))
+    return np.unique(indices[indices < points])
+
+
+def _sample_indices(points: int, budget: int) -> np.ndarray:
+    rng = np.random.default_rng(_SEED)
+    return np.sort(rng.choice(points, size=budget, replace=False))
+
+
+def _is_line(trace: dict) -> bool:
+    mode = trace.get("mode")
+    # Plotly draws traces of 20+ points without a mode as lines.
+    return trace.get("type", "scatter") in _LINE_TYPES and (
+        mode is None or "lines" in mode
+    )
+
+
+def _decimate_line(trace: dict, points: int, budget: int) -> tuple[dict, str]:
+    horizontal = trace.get("orientation") == "h"
+    values = _numeric(trace.get("x" if horizontal else "y"))
+    if values is None or len(values) != points:
+        indices = np.linspace(0, points - 1, budget).astype(np.int64)
+        method = "stride"
+    else:
+        # Two points per bucket plus the trace's end points.
+        indices = min_max_indices(values, max((budget - 2) // 2, 1))
+        method = "min-max"
+
+    decimated = _take(trace, indices, points)
+    # A missing coordinate means "0, 1, 2, ...": keep the positions explicit.
+    for key in ("x", "y"):
+        if key not in trace:
+            start = trace.get(f"{key}0", 0)
+            step = trace.get(f"d{key}", 1)
+            decimated[key] = start + indices * step
+            decimated.pop(f"{key}0", None)
+            decimated.pop(f"d{key}", None)
+    return decimated, method
+
+
+def _histogram_edges(values: np.ndarray, trace: dict, axis: str) -> np.ndarray:
+    bins = trace.get(f"{axis}bins") or {}
+    if bins.get("size") and bins.get("start") is not None:
+        end = bins.get("end", np.nanmax(values))
+        return np.arange(bins["start"], end + bins["size"], bins["size"])
+    nbins = trace.get(f"nbins{axis}")
+    if nbins:
+        return np.histogram_bin_edges(values[~np.isnan(values)], bins=nbins)
+    edges = np.histogram_bin_edges(values[~np.isnan(values)], bins="auto")
+    if len(edges) > _MAX_AUTO_BINS + 1:
+        edges = np.linspace(edges[0], edges[-1], _MAX_AUTO_BINS + 1)
+    return edges
+
+
+def _histogram_axes(trace: dict) -> tuple[str, str]:
+    """The binned axis and the count axis of a histogram trace."""
+    return ("y", "x") if "y" in trace and "x" not in trace else ("x", "y")
+
+
+def _histogram_values(trace: dict):
+    """
+    The samples of a histogram this module can bin: float values, or the raw
+    categories (an object array) for categorical data.
+
+    Returns None for histograms left to plotly.js (other histfuncs,
+    cumulative, both coordinates given, dates).
+    """
+    axis, other = _histogram_axes(trace)
+    if (
+        other in trace
+        or trace.get("histfunc") not in (None, "count")
+        or (trace.get("cumulative") or {}).get("enabled")
+    ):
+        return None
+    raw = np.asarray(trace.get(axis))
+    if raw.dtype.kind == "M":
+        return None  # date bins follow calendar rules; leave them to plotly.js
+    values = _numeric(raw)
+    return values if values is not None else raw.astype(object)
+
+
+def _histogram_group(trace: dict, barmode: str):
+    """
+    Traces plotly.js bins with shared edges: an explicit `bingroup`, or the
+    histograms of one subplot and orientation under a stacked, relative or
+    grouped bar mode.
+    """
+    if trace.get("bingroup"):
+        return ("bingroup", str(trace["bingroup"]))
+    if barmode in ("stack", "relative", "group"):
+        return (
+            "subplot",
+            trace.get("xaxis", "x"),
+            trace.get("yaxis", "y"),
+            _histogram_axes(trace)[0],
+        )
+    return None
+
+
+def _prebin_histogram(
+    trace: dict, values: np.ndarray, edges: Optional[np.ndarray] = None
+) -> dict:
+    """Replace a histogram's raw samples with a bar trace of its bins."""
+    axis, other = _histogram_axes(trace)
+    if values.dtype == object:
+        counts = pd.Series(values).value_counts(sort=False)
+        positions, heights, widths = counts.index.to_numpy(), counts.to_numpy(), None
+    else:
+        if edges is None:
+            edges = _histogram_edges(values, trace, axis)
+        heights, edges = np.histogram(values[~np.isnan(values)], bins=edges)
+        positions = (edges[:-1] + edges[1:]) / 2
+        widths = np.diff(edges)
+
+    heights = heights.astype(np.float64)
+    histnorm = trace.get("histnorm") or ""
+    total = heights.sum() or 1.0
+    if histnorm == "percent":
+        heights = heights / total * 100
+    elif histnorm == "probability":
+        heights = heights / total
+    elif histnorm == "density" and widths is not None:
+        heights = heights / widths
+    elif histnorm == "probability density" and widths is not None:
+        heights = heights / total / widths
+
+    bar = {
+        key: value for key, value in trace.items() if key not in _HISTOGRAM_ONLY_KEYS
+    }
+    bar.update({"type": "bar", axis: positions, other: heights})
+    if widths is not None:
+        bar["width"] = widths
+    if axis == "y":
+        bar["orientation"] = "h"
+    return bar
+
+
+def _prebin_histograms(
+    traces: list[dict], over_budget: list[bool], barmode: str
+) -> dict[int, dict]:
+    """
+    Bar traces for the histograms to bin, by trace index.
+
+    A histogram over its budget is binned together with every histogram in
+    its bin group, on edges computed from all of their samples, so stacked
+    or overlaid bars stay aligned. A group with a member that can't be
+    binned here is left to plotly.js whole.
+    """
+    groups: dict[object, list[int]] = {}
+    for index, trace in enumerate(traces):
+        if trace.get("type") == "histogram":
+            key = _histogram_group(trace, barmode)
+            groups.setdefault(key if key is not None else index, []).append(index)
+
+    bars = {}
+    for members in groups.values():
+        if not any(over_budget[index] for index in members):
+            continue
+        values = [_histogram_values(traces[index]) for index in members]
+        if any(value is None for value in values):
+            continue
+        numeric = [value for value in values if value.dtype != object]
+        if numeric and len(numeric) < len(values):
+            continue  # mixed numeric and categorical samples
+
+        edges = None
+        if numeric:
+            # Explicit bin settings on any member apply to the whole group.
+            settings = next(
+                (
+                    traces[index]
+                    for index in members
+                    if traces[index].get("xbins")
+                    or traces[index].get("ybins")
+                    or traces[index].get("nbinsx")
+                    or traces[index].get("nbinsy")
+                ),
+                traces[members[0]],
+            )
+            edges = _histogram_edges(
+                np.concatenate(numeric), settings, _histogram_axes(settings)[0]
+            )
+        for index, value in zip(members, values):
+            bars[index] = _prebin_histogram(traces[index], value, edges)
+    return bars
+
+
+def downsample_figure(
+    figure: dict, max_points: int = FIGURE_MAX_POINTS
+) -> tuple[dict, Optional[dict]]:
+    """
+    Reduce a figure's data to at most about `max_points` points.
+
+    Line traces keep each bucket's minimum and maximum, scatter-like traces
+    keep a seeded random sample, and histograms of raw samples are binned
+    here and sent as bar traces (with the traces sharing their bins, on
+    common edges). The budget is shared between traces in proportion to
+    their size. The input (the figure's own dicts) is never modified.
+
+    Args:
+        figure: {"data": [trace dicts], "layout": ..., "frames": ...}
+        max_points: Point budget for the whole figure; 0 disables
+
+    Returns:
+        The figure to serialize and a report of what was reduced, or None
+        when the figure already fits
+    """
+    traces = figure.get("data") or []
+    sizes = [_trace_points(trace) for trace in traces]
+    total = sum(sizes)
+    if not max_points or total <= max_points:
+        return figure, None
+
+    layout = figure.get("layout") or {}
+    budgets = [max(int(max_points * points / total), 2) for points in sizes]
+    bars = _prebin_histograms(
+        traces,
+        [points > budget for points, budget in zip(sizes, budgets)],
+        layout.get("barmode", "group"),
+    )
+
+    data = []
+    reduced = []
+    points_after = 0
+    for index, (trace, points) in enumerate(zip(traces, sizes)):
+        budget = budgets[index]
+        trace_type = trace.get("type", "scatter")
+        new_trace, method = trace, None
+
+        if index in bars:
+            new_trace, method = bars[index], "binned"
+        elif trace_type in _SCATTER_TYPES and points > budget:
+            if _is_line(trace):
+                new_trace, method = _decimate_line(trace, points, budget)
+            else:
+                indices = _sample_indices(points, budget)
+                new_trace, method = _take(trace, indices, points), "sample"
+
+        data.append(new_trace)
+        if method is None:
+            points_after += points
+            continue
+        kept = _trace_points(new_trace)
+        points_after += kept
+        reduced.append(
+            {
+                "trace": index,
+                "method": method,
+                "points_before": points,
+                "points_after": kept,
+            }
+        )
+
+    if not reduced:
+        return figure, None
+
+    if bars and "bargap" not in layout:
+        # Histogram bars touch; plain bars default to a 20% gap.
+        layout = {**layout, "bargap": 0}
+
+    downsampled = {**figure, "data": data, "layout": layout}
+    return downsampled, {
+        "points_before": total,
+        "points_after": points_after,
+        "traces": reduced,
+    }
@@ -0,0 +1,423 @@
+"""Pluggable backends that run python_repl code for tools_node."""
+
+import hashlib
+import multiprocessing
+import pickle
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from .config import REPL_EXECUTOR, REPL_POOL_WORKERS
+from .helpers import python_repl
+from .limits import ExecutionLimits, ExecutionTimeout, cap_address_space
+from .namespace import ReplNamespace
+
+# Shared frames a worker keeps attached; older datasets are released first.
+WORKER_FRAME_CACHE_SIZE = 4
+
+# Extra wall time the parent grants a worker to stop on its own before the
+# pool is torn down (code stuck inside a C call never sees the watchdog).
+WORKER_KILL_GRACE_SECONDS = 10.0
+
+_MISSING = object()
+
+_worker_frames: OrderedDict[str, tuple[SharedMemory, pd.DataFrame]] = OrderedDict()
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def _prepare_globals(extra_globals: dict | None, code: str, portable: bool) -> dict:
+    """Resolve session globals for one run; lazy values expose for_execution()."""
+    return {
+        name: (
+            value.for_execution(code, portable=portable)
+            if hasattr(value, "for_execution")
+            else value
+        )
+        for name, value in (extra_globals or {}).items()
+    }
+
+
+def _failed_result(error: str, error_type: str) -> dict:
+    return {
+        "stdout": "",
+        "result": None,
+        "figures": [],
+        "error": error,
+        "error_type": error_type,
+    }
+
+
+class InProcessExecutor:
+    """Run code directly in the calling thread (the original behaviour)."""
+
+    name = "in-process"
+
+    def __init__(self, limits: Optional[ExecutionLimits] = None):
+        self.limits = limits or ExecutionLimits()
+
+    def execute(
+        self,
+        code: str,
+        thoughts: str,
+        df: pd.DataFrame,
+        namespace: Optional[ReplNamespace] = None,
+        extra_globals: Optional[dict] = None,
+    ) -> dict:
+        return python_repl(
+            code=code,
+            thoughts=thoughts,
+            df=df,
+            namespace=namespace,
+            limits=self.limits,
+            extra_globals=_prepare_globals(extra_globals, code, portable=False),
+        )
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "limits": asdict(self.limits)}
+
+    def shutdown(self):
+        pass
+
+
+class _SharedFrame:
+    """A DataFrame published once into shared memory as an Arrow IPC stream."""
+
+    def __init__(self, df: pd.DataFrame):
+        try:
+            table = pa.Table.from_pandas(df)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            payload = sink.getvalue()
+            self.format = "arrow"
+        except (pa.ArrowException, TypeError, ValueError):
+            # Mixed-type object columns have no Arrow type; pickle them instead.
+            payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+            self.format = "pickle"
+
+        self.size = len(payload)
+        self.shm = SharedMemory(create=True, size=max(self.size, 1))
+        self.shm.buf[: self.size] = memoryview(payload).cast("B")
+
+    @property
+    def handle(self) -> tuple[str, int, str]:
+        return self.shm.name, self.size, self.format
+
+    def release(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _warm_worker():
+    """Pay the heavy imports once per worker instead of on the first tool call."""
+    import plotly.express  # noqa: F401
+    import sklearn  # noqa: F401
+    import statsmodels.api  # noqa: F401
+
+    python_repl(code="pass", thoughts="", df=pd.DataFrame())
+
+
+def _ping() -> bool:
+    return True
+
+
+def _attach_frame(handle: tuple[str, int, str]) -> pd.DataFrame:
+    name, size, payload_format = handle
+    cached = _worker_frames.get(name)
+    if cached is not None:
+        _worker_frames.move_to_end(name)
+        return cached[1]
+
+    shm = SharedMemory(name=name)
+    if payload_format == "arrow":
+        reader = pa.ipc.open_stream(pa.py_buffer(shm.buf[:size]))
+        # split_blocks lets numeric columns stay zero-copy views of the segment.
+        df = reader.read_all().to_pandas(split_blocks=True)
+    else:
+        df = pickle.loads(shm.buf[:size])
+
+    _worker_frames[name] = (shm, df)
+    while len(_worker_frames) > WORKER_FRAME_CACHE_SIZE:
+        _, (old_shm, _) = _worker_frames.popitem(last=False)
+        try:
+            old_shm.close()
+        except BufferError:
+            # Frames from an earlier call still view the segment; let GC close it.
+            pass
+    return df
+
+
+def _picklable(value) -> bool:
+    try:
+        pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
+
+
+def _digest(value) -> Optional[bytes]:
+    """Digest of a value's pickle, or None if it can't be pickled."""
+    try:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _run_in_worker(
+    code: str,
+    thoughts: str,
+    handle: tuple[str, int, str],
+    bindings: dict | None,
+    limits: ExecutionLimits,
+    extra_globals: dict,
+) -> dict:
+    df = _attach_frame(handle)
+    cap_address_space(limits)
+    # Shipped caches (df_stats) compute their misses on the attached frame.
+    extra_globals = {
+        name: value.with_frame(df) if hasattr(value, "with_frame") else value
+        for name, value in (extra_globals or {}).items()
+    }
+
+    namespace = None
+    digests = {}
+    if bindings is not None:
+        namespace = ReplNamespace(max_bytes=sys.maxsize)
+        namespace.absorb(bindings)
+        # In-place changes (model.fit(), lst.append()) keep an object's
+        # identity, so compare contents to find what the code modified.
+        digests = {name: _digest(value) for name, value in bindings.items()}
+
+    tool_result = python_repl(
+        code=code,
+        thoughts=thoughts,
+        df=df,
+        namespace=namespace,
+        limits=limits,
+        extra_globals=extra_globals,
+    )
+
+    if not _picklable(tool_result.get("result")):
+        tool_result["result"] = repr(tool_result["result"])
+
+    if namespace is not None:
+        # Ship back only values the code rebound or modified; the parent
+        # keeps the rest.
+        changed = {}
+        kept = []
+        for name, value in namespace.bindings().items():
+            digest = _digest(value)
+            if bindings.get(name, _MISSING) is value and digest in (
+                digests[name],
+                None,  # no longer picklable: the parent keeps its copy
+            ):
+                kept.append(name)
+            elif digest is not None:
+                changed[name] = value
+                kept.append(name)
+        tool_result["variables"] = sorted(kept)
+        tool_result["namespace_updates"] = changed
+
+    return tool_result
+
+
+class WorkerPoolExecutor:
+    """
+    Run code in a pool of pre-warmed worker processes.
+
+    Each DataFrame is published to shared memory once and attached lazily by
+    the workers, so CPU-heavy generated code no longer holds the API process's
+    GIL and concurrent sessions scale with the number of cores.
+
+    Limits are enforced inside the worker; if a worker still hasn't returned
+    WORKER_KILL_GRACE_SECONDS after the wall-clock limit, the whole pool is
+    replaced, and other calls running on it fail with "worker_crashed".
+    """
+
+    name = "process-pool"
+
+    def __init__(
+        self,
+        max_workers: int = REPL_POOL_WORKERS,
+        warm: bool = True,
+        limits: Optional[ExecutionLimits] = None,
+    ):
+        self.max_workers = max_workers
+        self.limits = limits or ExecutionLimits()
+        self.recycled_pools = 0
+        self._pool = self._new_pool()
+        self._shared: dict[int, _SharedFrame] = {}
+        self._lock = threading.Lock()
+
+        if warm:
+            self.warm()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        start_methods = multiprocessing.get_all_start_methods()
+        # Forking a threaded server is unsafe; forkserver/spawn start clean.
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in start_methods else "spawn"
+        )
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_warm_worker,
+        )
+
+    def warm(self):
+        """Start every worker now so the first tool call doesn't pay for it."""
+        wait([self._pool.submit(_ping) for _ in range(self.max_workers)])
+
+    def _recycle_pool(self, broken_pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is not broken_pool:
+                return  # another call already replaced it
+            self._pool = self._new_pool()
+            self.recycled_pools += 1
+
+        for process in list((broken_pool._processes or {}).values()):
+            process.terminate()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _share(self, df: pd.DataFrame) -> _SharedFrame:
+        key = id(df)
+        with self._lock:
+            shared = self._shared.get(key)
+            if shared is None:
+                shared = _SharedFrame(df)
+                self._shared[key] = shared
+                weakref.finalize(df, self._release, key)
+            return shared
+
+    def _release(self, key: int):
+        with self._lock:
+            shared = self._shared.pop(key, None)
+        if shared is not None:
+            shared.release()
+
+    def execute(
+        self,
+        code: str,
+        thoughts: str,
+        df: pd.DataFrame,
+        namespace: Optional[ReplNamespace] = None,
+        extra_globals: Optional[dict] = None,
+    ) -> dict:
+        shared = self._share(df)
+        # Pickle only the persisted values this code can use, not the whole
+        # namespace; the parent keeps the rest.
+        bindings = (
+            namespace.referenced_bindings(code) if namespace is not None else None
+        )
+        # Lazy globals can't be shipped; send only what this code needs.
+        extra_globals = _prepare_globals(extra_globals, code, portable=True)
+
+        pool = self._pool
+        timeout = None
+        if self.limits.wall_seconds:
+            timeout = self.limits.wall_seconds + WORKER_KILL_GRACE_SECONDS
+
+        try:
+            future = pool.submit(
+                _run_in_worker,
+                code,
+                thoughts,
+                shared.handle,
+                bindings,
+                self.limits,
+                extra_globals,
+            )
+            tool_result = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._recycle_pool(pool)
+            return _failed_result(
+                self.limits.describe(ExecutionTimeout.error_type),
+                ExecutionTimeout.error_type,
+            )
+        except BrokenProcessPool:
+            self._recycle_pool(pool)
+            return _failed_result(
+                "Execution stopped: the worker process running the code died, "
+                "most likely because it ran out of memory. Retry with a cheaper "
+                "approach, e.g. work on a sample or aggregate first.",
+                "worker_crashed",
+            )
+
+        updates = tool_result.pop("namespace_updates", None)
+        if namespace is not None and updates is not None:
+            env_vars = {
+                name: updates[name] if name in updates else bindings[name]
+                for name in tool_result.get("variables", [])
+            }
+            tool_result["variables"] = namespace.absorb(env_vars, previous=bindings)
+
+        return tool_result
+
+    def stats(self) -> dict:
+        with self._lock:
+            shared_bytes = sum(shared.size for shared in self._shared.values())
+            shared_frames = len(self._shared)
+        return {
+            "backend": self.name,
+            "workers": self.max_workers,
+            "shared_frames": shared_frames,
+            "shared_bytes": shared_bytes,
+            "recycled_pools": self.recycled_pools,
+            "limits": asdict(self.limits),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            shared_frames = list(self._shared.values())
+            self._shared.clear()
+        for shared in shared_frames:
+            shared.release()
+
+
+EXECUTOR_BACKENDS = {
+    InProcessExecutor.name: InProcessExecutor,
+    WorkerPoolExecutor.name: WorkerPoolExecutor,
+}
+
+
+def build_executor(backend: str = REPL_EXECUTOR):
+    try:
+        return EXECUTOR_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown executor backend '{backend}'. Choose one of: "
+            + ", ".join(sorted(EXECUTOR_BACKENDS))
+        ) from None
+
+
+def get_default_executor():
+    """Process-wide executor shared by every session (one worker pool)."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = build_executor()
+        return _default_executor
+
+
+def shutdown_default_executor():
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is not None:
+            _default_executor.shutdown()
+            _default_executor = None
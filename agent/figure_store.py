@@ -0,0 +1,169 @@
+"""Content-addressed on-disk store for serialized Plotly figures."""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Optional
+
+from .config import FIGURE_STORE_DIR, FIGURE_STORE_MAX_BYTES
+
+_GZIP_LEVEL = 5
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+class FigureStore:
+    """
+    Figure JSON kept gzip-compressed on disk, keyed by its SHA-256.
+
+    python_repl writes each captured figure here as soon as it is serialized,
+    so figure payloads in tool results, checkpoints, session snapshots and
+    API responses carry only the digest and size. Identical figures (a
+    memoized rerun, the same chart in two sessions) are stored once.
+    Entries are immutable, which makes the digest a natural ETag. Worker
+    processes write to the same directory.
+
+    Once the compressed files exceed `max_bytes` (0 disables), the least
+    recently read ones are deleted; sessions still referring to them get a
+    404 from the figure endpoint.
+    """
+
+    def __init__(
+        self,
+        directory: str = FIGURE_STORE_DIR,
+        max_bytes: int = FIGURE_STORE_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self.dedup_hits = 0
+        self.evictions = 0
+        self._bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+    def _files(self) -> list[os.DirEntry]:
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                files.extend(entry for entry in os.scandir(shard) if entry.is_file())
+        return files
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(entry.stat().st_size for entry in self._files())
+            return self._bytes
+
+    def __contains__(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def put(self, figure_json: str) -> dict:
+        """
+        Store one figure and return its reference.
+
+        Returns:
+            {"sha256": hex digest, "bytes": size of the uncompressed JSON}
+        """
+        data = figure_json.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        reference = {"sha256": digest, "bytes": len(data)}
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            self.dedup_hits += 1
+            return reference
+
+        compressed = gzip.compress(data, compresslevel=_GZIP_LEVEL, mtime=0)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial file.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(compressed)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.writes += 1
+        total = self.total_bytes
+        with self._lock:
+            self._bytes = total + len(compressed)
+        if self.max_bytes and self._bytes > self.max_bytes:
+            self.prune()
+        return reference
+
+    def get_compressed(self, digest: str) -> Optional[bytes]:
+        """Gzip-compressed JSON of a stored figure, or None if absent."""
+        path = self.path(digest)
+        try:
+            with open(path, "rb") as handle:
+                data = handle.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def get(self, digest: str) -> Optional[str]:
+        """JSON of a stored figure, or None if absent."""
+        data = self.get_compressed(digest)
+        return gzip.decompress(data).decode("utf-8") if data is not None else None
+
+    def prune(self):
+        """Delete least recently used figures until the store fits max_bytes."""
+        with self._lock:
+            files = sorted(
+                (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                for entry in self._files()
+                if entry.name.endswith(".json.gz")
+            )
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+            self._bytes = total
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "writes": self.writes,
+            "dedup_hits": self.dedup_hits,
+            "evictions": self.evictions,
+        }
+
+
+def get_figure_store() -> FigureStore:
+    """Process-wide figure store."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = FigureStore()
+        return _default_store
+
+
+def load_figure_json(figure_payload) -> Optional[str]:
+    """Figure JSON of a payload, read from the store when it isn't inline."""
+    if not isinstance(figure_payload, dict):
+        return None
+    if figure_payload.get("figure_json"):
+        return figure_payload["figure_json"]
+    digest = figure_payload.get("sha256")
+    return get_figure_store().get(digest) if digest else None
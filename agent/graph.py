@@ -14,17 +14,37 @@ class DataScienceGraph:
     """Graph wrapper with injected runtime dependencies."""
 
     def __init__(
-        self, llm_with_tools, df_getter: Callable[[], pd.DataFrame], memory=None
+        self,
+        llm_with_tools,
+        df_getter: Callable[[], pd.DataFrame],
+        memory=None,
+        namespace_getter: Callable[[], object] | None = None,
+        executor=None,
+        extra_globals_getter: Callable[[], dict] | None = None,
+        dataset_key_getter: Callable[[], str | None] | None = None,
     ):
         self.memory = memory or MemorySaver()
         self.llm_with_tools = llm_with_tools
         self.df_getter = df_getter
+        self.namespace_getter = namespace_getter
+        self.executor = executor
+        self.extra_globals_getter = extra_globals_getter
+        self.dataset_key_getter = dataset_key_getter
         self.compiled_graph = self._build_graph()
 
     def _build_graph(self):
         workflow = StateGraph(MessagesStateWithTools)
         workflow.add_node("agent", create_agent_node(self.llm_with_tools))
-        workflow.add_node("tools", create_tools_node(self.df_getter))
+        workflow.add_node(
+            "tools",
+            create_tools_node(
+                self.df_getter,
+                self.namespace_getter,
+                self.executor,
+                self.extra_globals_getter,
+                self.dataset_key_getter,
+            ),
+        )
         workflow.add_node("store_response", store_response)
 
         workflow.add_edge(START, "agent")
@@ -39,5 +59,19 @@ class DataScienceGraph:
     def invoke(self, state: dict, config: dict = None):
         return self.compiled_graph.invoke(state, config=config)
 
+    async def ainvoke(self, state: dict, config: dict = None):
+        return await self.compiled_graph.ainvoke(state, config=config)
+
+    def stream(self, state: dict, config: dict = None, stream_mode=None):
+        return self.compiled_graph.stream(state, config=config, stream_mode=stream_mode)
+
+    def astream(self, state: dict, config: dict = None, stream_mode=None):
+        return self.compiled_graph.astream(
+            state, config=config, stream_mode=stream_mode
+        )
+
     def get_state(self, config: dict):
         return self.compiled_graph.get_state(config)
+
+    async def aget_state(self, config: dict):
+        return await self.compiled_graph.aget_state(config)
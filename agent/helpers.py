@@ -2,17 +2,43 @@
 
 import json
 import ast
+import base64
+import sys
+import threading
 import traceback
 import uuid
-from contextlib import redirect_stdout
-from io import StringIO
-from typing import Tuple
+from contextlib import contextmanager
+from io import StringIO, TextIOBase
+from typing import Optional, Tuple
 
+import orjson
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
 import plotly.express as px
 
+from .config import (
+    FIGURE_MAX_POINTS,
+    FIGURE_STORE,
+    FIGURE_TYPED_ARRAYS,
+    REPL_COPY_ON_WRITE,
+)
+from .downsampling import downsample_figure
+from .figure_store import get_figure_store
+from .limits import (
+    ExecutionLimitExceeded,
+    ExecutionLimits,
+    ExecutionWatchdog,
+    MemoryLimitExceeded,
+    NO_LIMITS,
+)
+from .namespace import ReplNamespace
+
+if REPL_COPY_ON_WRITE:
+    # With copy-on-write enabled pandas only copies the blocks that model code
+    # actually mutates, so python_repl can share the session frame safely.
+    pd.set_option("mode.copy_on_write", True)
+
 
 def _normalize_message_content(content) -> str:
     """Extract plain text from LangChain message content (str, list of blocks, or None)."""
@@ -72,6 +98,13 @@ def clean_code_string(code: str) -> str:
     return cleaned
 
 
+def _code_and_thoughts(args: dict) -> Tuple[str, str]:
+    # python_repl sends `code`, sql_query sends `query`.
+    code = args.get("code") or args.get("query") or ""
+    thoughts = args.get("thoughts", "") or ""
+    return code, thoughts
+
+
 def extract_code_and_thoughts(last_message, tc=None) -> Tuple[str, str]:
     """
     Extract code and thoughts from LLM message or tool call.
@@ -89,18 +122,14 @@ def extract_code_and_thoughts(last_message, tc=None) -> Tuple[str, str]:
 
         # If args is a dict, extract directly
         if isinstance(args, dict):
-            code = args.get("code", "") or ""
-            thoughts = args.get("thoughts", "") or ""
-            return code, thoughts
+            return _code_and_thoughts(args)
 
         # If args is a JSON string, parse it
         if isinstance(args, str) and args.strip():
             try:
                 parsed = json.loads(args)
                 if isinstance(parsed, dict):
-                    code = parsed.get("code", "") or ""
-                    thoughts = parsed.get("thoughts", "") or ""
-                    return code, thoughts
+                    return _code_and_thoughts(parsed)
             except json.JSONDecodeError:
                 # Treat as raw code
                 return args, ""
@@ -114,9 +143,7 @@ def extract_code_and_thoughts(last_message, tc=None) -> Tuple[str, str]:
                 try:
                     parsed = json.loads(args_json)
                     if isinstance(parsed, dict):
-                        code = parsed.get("code", "") or ""
-                        thoughts = parsed.get("thoughts", "") or ""
-                        return code, thoughts
+                        return _code_and_thoughts(parsed)
                 except json.JSONDecodeError:
                     pass
 
@@ -148,6 +175,168 @@ def _make_json_safe(obj):
     return obj
 
 
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj):
+    """Values orjson can't encode natively (object/str arrays, pandas scalars)."""
+    import datetime as dt
+    import decimal
+
+    import numpy as np
+
+    if isinstance(obj, np.ndarray):
+        # Object and fixed-width string arrays; numeric ones never get here.
+        return obj.tolist()
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.to_numpy()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, (dt.datetime, dt.date, dt.time)):
+        # pd.Timestamp and other subclasses orjson leaves to this hook
+        # (e.g. tz-aware values in object arrays).
+        return obj.isoformat()
+    if isinstance(obj, (pd.Timedelta, dt.timedelta, pd.Interval, pd.Period)):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "to_plotly_json"):
+        return obj.to_plotly_json()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+# numpy dtypes plotly.js decodes from typed-array specs, and the narrower
+# integer types 64-bit integers are downcast to (plotly.js has no int64).
+_TYPED_ARRAY_DTYPES = {
+    "int8": "i1",
+    "uint8": "u1",
+    "int16": "i2",
+    "uint16": "u2",
+    "int32": "i4",
+    "uint32": "u4",
+    "float32": "f4",
+    "float64": "f8",
+}
+_INT_DOWNCASTS = {
+    "i": ("int8", "int16", "int32"),
+    "u": ("uint8", "uint16", "uint32"),
+}
+# Plain lists at least this long are tried as numeric arrays.
+_TYPED_ARRAY_MIN_LIST = 1000
+
+
+def to_typed_array(array):
+    """
+    Plotly's typed-array spec for a numeric numpy array.
+
+    The buffer is base64-encoded as is (`{"dtype": "f8", "bdata": ...}`,
+    plus "shape" for 2-D data such as heatmap z), so no per-element
+    conversion happens and NaN survives as a gap. Arrays plotly.js can't
+    type (object, datetime, bool, out-of-range int64) are returned unchanged.
+    """
+    import numpy as np
+
+    if not isinstance(array, np.ndarray) or array.size == 0:
+        return array
+    if array.dtype.kind in "iu" and array.dtype.itemsize == 8:
+        low, high = array.min(), array.max()
+        for name in _INT_DOWNCASTS[array.dtype.kind]:
+            limits = np.iinfo(name)
+            if limits.min <= low and high <= limits.max:
+                array = array.astype(name)
+                break
+        else:
+            return array
+    elif array.dtype == np.float16:
+        array = array.astype(np.float32)
+
+    code = _TYPED_ARRAY_DTYPES.get(array.dtype.name)
+    if code is None:
+        return array
+    if not array.dtype.isnative:
+        array = array.astype(array.dtype.newbyteorder("="))
+    spec = {
+        "dtype": code,
+        "bdata": base64.b64encode(np.ascontiguousarray(array)).decode("ascii"),
+    }
+    if array.ndim > 1:
+        spec["shape"] = ", ".join(str(size) for size in array.shape)
+    return spec
+
+
+def _numeric_list(values: list):
+    import numpy as np
+
+    first = values[0]
+    if isinstance(first, bool) or not isinstance(first, (int, float)):
+        return None
+    try:
+        array = np.asarray(values)
+    except (ValueError, OverflowError):
+        return None
+    return array if array.dtype.kind in "iuf" else None
+
+
+def _encode_typed_arrays(obj):
+    """Copy of a figure dict with its numeric arrays as typed-array specs."""
+    import numpy as np
+
+    if isinstance(obj, dict):
+        return {key: _encode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (pd.Series, pd.Index)):
+        obj = obj.to_numpy()
+    if isinstance(obj, np.ndarray):
+        return to_typed_array(obj)
+    if isinstance(obj, (list, tuple)) and obj:
+        if len(obj) >= _TYPED_ARRAY_MIN_LIST:
+            array = _numeric_list(obj)
+            if array is not None:
+                return to_typed_array(array)
+        # Only nested structures (traces, annotations, colorscales) can hold
+        # arrays; long lists of scalars are left for orjson.
+        if isinstance(obj[0], (dict, list, tuple, np.ndarray)):
+            return [_encode_typed_arrays(item) for item in obj]
+    return obj
+
+
+def _figure_dict(fig) -> dict:
+    # The figure's own trace and layout dicts; `fig.to_dict()` deep-copies them.
+    figure = {"data": fig._data, "layout": fig._layout}
+    frames = [frame._props for frame in fig._frame_objs]
+    if frames:
+        figure["frames"] = frames
+    return figure
+
+
+def figure_to_json(
+    fig, max_points: int = 0, typed_arrays: bool = False
+) -> Tuple[str, Optional[dict]]:
+    """
+    Encode a Plotly figure to JSON in a single orjson pass.
+
+    Lets orjson encode numpy arrays, NaN/inf (as null) and datetimes
+    natively, so no Python-level walk over the data is needed. With a
+    `max_points` budget the data is first reduced by downsample_figure(),
+    and `typed_arrays` sends numeric arrays as base64 typed arrays (see
+    to_typed_array); the figure itself is left untouched either way.
+    Output parses with `plotly.io.from_json`.
+
+    Returns:
+        The JSON string and the downsampling report (None if not reduced)
+    """
+    figure, report = downsample_figure(_figure_dict(fig), max_points)
+    return _encode_figure(figure, typed_arrays), report
+
+
+def _encode_figure(figure: dict, typed_arrays: bool) -> str:
+    if typed_arrays:
+        figure = _encode_typed_arrays(figure)
+    payload = orjson.dumps(figure, default=_orjson_default, option=_ORJSON_OPTIONS)
+    return payload.decode()
+
+
 def serialize_plotly_figure(fig, index: int) -> dict:
     title = None
     try:
@@ -157,24 +346,113 @@ def serialize_plotly_figure(fig, index: int) -> dict:
     except Exception:
         title = None
 
+    # Reduce first, so the point budget applies to the fallback encoder too.
     try:
-        fig_dict = fig.to_dict()
-        cleaned_dict = _make_json_safe(fig_dict)
-        figure_json = json.dumps(cleaned_dict)
+        figure, downsampled = downsample_figure(_figure_dict(fig), FIGURE_MAX_POINTS)
     except Exception:
-        figure_json = json.dumps({"error": "Failed to serialize figure"})
+        figure, downsampled = fig, None
+    try:
+        figure_json = _encode_figure(
+            figure if isinstance(figure, dict) else _figure_dict(figure),
+            FIGURE_TYPED_ARRAYS,
+        )
+    except Exception:
+        try:
+            # Plotly's encoder knows a few more exotic types (PIL images, ...).
+            figure_json = pio.to_json(figure, validate=False)
+        except Exception:
+            figure_json = json.dumps({"error": "Failed to serialize figure"})
 
-    return {
+    figure_payload = {
         "id": str(uuid.uuid4()),
         "title": title or f"Figure {index}",
         "figure_json": figure_json,
+        "bytes": len(figure_json.encode("utf-8")),
+        "downsampled": downsampled or False,
     }
+    if FIGURE_STORE:
+        try:
+            figure_payload.update(get_figure_store().put(figure_json))
+            del figure_payload["figure_json"]
+        except OSError:
+            pass  # keep the figure inline
+    return figure_payload
+
+
+class _ThreadRoutedStdout(TextIOBase):
+    """sys.stdout proxy that sends each thread's writes to its own buffer."""
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self._fallback
+
+    def writable(self) -> bool:
+        return True
 
+    def write(self, text: str) -> int:
+        return self._target().write(text)
 
-def python_repl(code: str, thoughts: str, df: pd.DataFrame) -> dict:
+    def flush(self):
+        self._target().flush()
+
+
+_stdout_router_lock = threading.Lock()
+
+
+@contextmanager
+def capture_stdout(buffer: StringIO):
+    """
+    Capture print() output of the current thread only.
+
+    contextlib.redirect_stdout swaps the process-wide sys.stdout, so tool
+    calls running in parallel threads would write into each other's buffers.
+    """
+    with _stdout_router_lock:
+        if not isinstance(sys.stdout, _ThreadRoutedStdout):
+            sys.stdout = _ThreadRoutedStdout(sys.stdout)
+        router = sys.stdout
+
+    previous = getattr(router._local, "buffer", None)
+    router._local.buffer = buffer
+    try:
+        yield buffer
+    finally:
+        router._local.buffer = previous
+
+
+def _isolated_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a frame model code can mutate without touching the session's df."""
+    if pd.get_option("mode.copy_on_write"):
+        # Shallow copy is O(columns): the data buffers are shared until written.
+        return df.copy(deep=False)
+    return df.copy()
+
+
+def python_repl(
+    code: str,
+    thoughts: str,
+    df: pd.DataFrame,
+    namespace: Optional[ReplNamespace] = None,
+    limits: Optional[ExecutionLimits] = None,
+    extra_globals: Optional[dict] = None,
+) -> dict:
     """
     Execute Python code and return:
-      { stdout: str, result: any or None, figures: [figure payloads], error: str or None }
+      { stdout: str, result: any or None, figures: [figure payloads],
+        error: str or None, error_type: str or None }
+
+    `error_type` is "exception" for errors raised by the code, or "timeout",
+    "cpu_time_exceeded" / "memory_exceeded" when `limits` stopped it.
+
+    When a persistent `namespace` is given, its variables are injected before
+    execution and new ones are stored back, and the result also carries
+    `variables`: the names available to the next call.
+
+    `extra_globals` are session-specific names bound next to `df` (e.g.
+    `sheets` for multi-sheet workbooks); they are never persisted.
     """
     # Lazy imports — only pay the load cost when code is actually executed.
     # Python caches these after the first call so there's no repeat overhead.
@@ -182,12 +460,13 @@ def python_repl(code: str, thoughts: str, df: pd.DataFrame) -> dict:
     import statsmodels.api as sm
 
     code = clean_code_string(code)
+    limits = limits or NO_LIMITS
     serialized_figures = []
     stdout_buf = StringIO()
 
     env_vars = {
         "__builtins__": __builtins__,
-        "df": df.copy(),
+        "df": _isolated_frame(df),
         "pd": pd,
         "px": px,
         "go": go,
@@ -195,22 +474,38 @@ def python_repl(code: str, thoughts: str, df: pd.DataFrame) -> dict:
         "sklearn": sklearn,
         "sm": sm,
         "plotly_figures": [],
+        **(extra_globals or {}),
     }
+    persisted = namespace.bindings(code) if namespace is not None else {}
+    env_vars.update(persisted)
 
     try:
-        # redirect_stdout is context-local — safe under concurrent FastAPI requests
-        # unlike a global sys.stdout swap which would race across threads.
-        with redirect_stdout(stdout_buf):
+        # capture_stdout routes per thread, so concurrent requests and parallel
+        # tool calls never see each other's output.
+        with capture_stdout(stdout_buf), ExecutionWatchdog(limits):
             exec(code, env_vars, env_vars)
 
         for index, fig in enumerate(env_vars.get("plotly_figures", []), start=1):
             serialized_figures.append(serialize_plotly_figure(fig, index))
 
-        return {
+        tool_result = {
             "stdout": stdout_buf.getvalue() or "",
             "result": env_vars.get("result", None),
             "figures": serialized_figures,
             "error": None,
+            "error_type": None,
+        }
+        if namespace is not None:
+            tool_result["variables"] = namespace.absorb(env_vars, previous=persisted)
+        return tool_result
+    except (ExecutionLimitExceeded, MemoryError) as exc:
+        error_type = getattr(exc, "error_type", MemoryLimitExceeded.error_type)
+        return {
+            "stdout": stdout_buf.getvalue() or "",
+            "result": None,
+            "figures": serialized_figures,
+            "error": limits.describe(error_type),
+            "error_type": error_type,
         }
     except Exception:
         return {
@@ -218,4 +513,5 @@ def python_repl(code: str, thoughts: str, df: pd.DataFrame) -> dict:
             "result": None,
             "figures": serialized_figures,
             "error": traceback.format_exc(),
+            "error_type": "exception",
         }
@@ -0,0 +1,185 @@
+"""Wall-clock, CPU-time and memory limits for python_repl executions."""
+
+import ctypes
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from .config import (
+    REPL_CPU_TIME_LIMIT_SECONDS,
+    REPL_MEMORY_LIMIT_MB,
+    REPL_WALL_TIMEOUT_SECONDS,
+)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ExecutionLimitExceeded(BaseException):
+    """
+    Raised inside the executing thread when a limit is breached.
+
+    Derives from BaseException so a bare `except Exception` in generated code
+    cannot swallow it and keep running.
+    """
+
+    error_type = "limit_exceeded"
+
+
+class ExecutionTimeout(ExecutionLimitExceeded):
+    error_type = "timeout"
+
+
+class CpuTimeExceeded(ExecutionLimitExceeded):
+    error_type = "cpu_time_exceeded"
+
+
+class MemoryLimitExceeded(ExecutionLimitExceeded):
+    error_type = "memory_exceeded"
+
+
+@dataclass(frozen=True)
+class ExecutionLimits:
+    """Per-call limits; None or 0 disables a limit."""
+
+    wall_seconds: Optional[float] = REPL_WALL_TIMEOUT_SECONDS or None
+    cpu_seconds: Optional[float] = REPL_CPU_TIME_LIMIT_SECONDS or None
+    memory_bytes: Optional[int] = REPL_MEMORY_LIMIT_MB * 1024 * 1024 or None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.wall_seconds or self.cpu_seconds or self.memory_bytes)
+
+    def describe(self, error_type: str) -> str:
+        if error_type == ExecutionTimeout.error_type:
+            limit = f"the {self.wall_seconds:g}s wall-clock limit"
+        elif error_type == CpuTimeExceeded.error_type:
+            limit = f"the {self.cpu_seconds:g}s CPU-time limit"
+        elif error_type == MemoryLimitExceeded.error_type and self.memory_bytes:
+            limit = f"the {self.memory_bytes / 1024**2:,.0f} MB memory limit"
+        else:
+            limit = "the available memory"
+        return (
+            f"Execution stopped: the code exceeded {limit}. "
+            "Retry with a cheaper approach, e.g. aggregate before plotting, "
+            "work on a sample, or avoid cross joins and row-wise Python loops."
+        )
+
+
+NO_LIMITS = ExecutionLimits(wall_seconds=None, cpu_seconds=None, memory_bytes=None)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _async_raise(thread_id: int, exc_type) -> None:
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exc_type) if exc_type else None
+    )
+
+
+class ExecutionWatchdog:
+    """
+    Enforce ExecutionLimits on the thread that enters the context.
+
+    A daemon thread polls elapsed time, the thread's own CPU clock and the
+    process RSS, and raises the matching ExecutionLimitExceeded subclass into
+    the executing thread at its next bytecode boundary.
+    """
+
+    def __init__(self, limits: ExecutionLimits, poll_interval: float = 0.05):
+        self.limits = limits
+        self.poll_interval = poll_interval
+        self.breach = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._active = False
+
+    def __enter__(self):
+        if not self.limits.enabled:
+            return self
+
+        self._thread_id = threading.get_ident()
+        self._started = time.monotonic()
+        self._cpu_clock = None
+        if self.limits.cpu_seconds and hasattr(time, "pthread_getcpuclockid"):
+            self._cpu_clock = time.pthread_getcpuclockid(self._thread_id)
+            self._cpu_started = time.clock_gettime(self._cpu_clock)
+        self._rss_baseline = current_rss() if self.limits.memory_bytes else None
+
+        self._active = True
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._active = False
+            self._stop.set()
+            if self.breach is not None and exc_type is None:
+                # The breach raced with normal completion; drop the pending
+                # exception so it can't surface somewhere unrelated.
+                _async_raise(self._thread_id, None)
+        return False
+
+    def _check(self):
+        limits = self.limits
+        if limits.wall_seconds and (
+            time.monotonic() - self._started > limits.wall_seconds
+        ):
+            return ExecutionTimeout
+        if self._cpu_clock is not None and (
+            time.clock_gettime(self._cpu_clock) - self._cpu_started > limits.cpu_seconds
+        ):
+            return CpuTimeExceeded
+        if self._rss_baseline is not None:
+            rss = current_rss()
+            if rss is not None and rss - self._rss_baseline > limits.memory_bytes:
+                return MemoryLimitExceeded
+        return None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            breach = self._check()
+            if breach is None:
+                continue
+            with self._lock:
+                if self._active:
+                    self.breach = breach
+                    _async_raise(self._thread_id, breach)
+            return
+
+
+def cap_address_space(limits: ExecutionLimits):
+    """
+    Bound this process's address space to current usage plus the memory limit.
+
+    Only used inside dedicated worker processes: a single huge allocation
+    (e.g. an accidental cross join) then fails with MemoryError instead of
+    waking the OOM killer before the RSS watchdog can react.
+    """
+    if resource is None or not limits.memory_bytes:
+        return
+
+    try:
+        with open("/proc/self/statm") as statm:
+            address_space = int(statm.read().split()[0]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return
+
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = address_space + limits.memory_bytes
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
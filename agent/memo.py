@@ -0,0 +1,200 @@
+"""Opt-in memoization of python_repl results for repeated, deterministic code."""
+
+import ast
+import hashlib
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from .config import REPL_MEMO, REPL_MEMO_MAX_BYTES
+from .helpers import clean_code_string
+from .namespace import ReplNamespace
+
+# Names and attributes whose results can differ between identical runs
+# (randomness, clocks, I/O, environment) or that fit models, which usually
+# involves randomness. Code touching any of them is never memoized.
+_NONDETERMINISTIC = frozenset(
+    {
+        "random",
+        "rand",
+        "randn",
+        "randint",
+        "random_sample",
+        "choice",
+        "sample",
+        "shuffle",
+        "permutation",
+        "default_rng",
+        "now",
+        "today",
+        "utcnow",
+        "time",
+        "perf_counter",
+        "monotonic",
+        "uuid1",
+        "uuid4",
+        "urandom",
+        "open",
+        "input",
+        "exec",
+        "eval",
+        "compile",
+        "__import__",
+        "globals",
+        "locals",
+        "vars",
+        "getenv",
+        "environ",
+        "sklearn",
+        "sm",
+        "fit",
+        "fit_transform",
+        "fit_predict",
+        "train_test_split",
+    }
+)
+
+_default_memo = None
+_default_memo_lock = threading.Lock()
+
+
+def is_deterministic(code: str) -> bool:
+    """Conservative check that running `code` twice gives the same output."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.Global, ast.Nonlocal)):
+            return False
+        if isinstance(node, ast.Name) and node.id in _NONDETERMINISTIC:
+            return False
+        if isinstance(node, ast.Attribute) and node.attr in _NONDETERMINISTIC:
+            return False
+    return True
+
+
+def _result_size(tool_result: dict) -> int:
+    try:
+        return len(pickle.dumps(tool_result, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return -1
+
+
+class ReplMemo:
+    """
+    Results of successful python_repl runs keyed by what determines them.
+
+    The key is (dataset hash, hash of the cleaned code, namespace state):
+    the same code on the same upload with the same persisted variables
+    prints the same output, so a retried prompt that makes the model emit
+    identical code is answered without executing it. Only code that passes
+    is_deterministic() and names no persisted variable is cached (in-place
+    changes like `items.append(...)` don't show in the namespace version),
+    and only runs that succeeded and left the persistent namespace
+    unchanged, since a hit can't replay new bindings.
+
+    Entries are evicted least recently used first once the pickled results
+    exceed `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = REPL_MEMO_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[dict, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self._entries.values())
+
+    def key(
+        self,
+        dataset_key: Optional[str],
+        code: str,
+        namespace: Optional[ReplNamespace] = None,
+    ) -> Optional[str]:
+        """Cache key for one run, or None when the run must not be memoized."""
+        if not dataset_key:
+            return None
+        code = clean_code_string(code)
+        if not is_deterministic(code):
+            return None
+        if namespace is not None and namespace.references(code):
+            return None
+        # Namespace versions count per session, so an instance id is needed
+        # to tell two sessions' persisted variables apart.
+        namespace_state = (
+            f"{namespace.uid}:{namespace.version}" if namespace is not None else "-"
+        )
+        code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        return f"{dataset_key}:{code_hash}:{namespace_state}"
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            tool_result = entry[0]
+
+        # Figures are registered per run; give the replayed ones fresh ids.
+        return {
+            **tool_result,
+            "figures": [
+                {**figure_payload, "id": str(uuid.uuid4())}
+                for figure_payload in tool_result.get("figures", [])
+            ],
+            "memoized": True,
+        }
+
+    def put(self, key: str, tool_result: dict, namespace_changed: bool = False):
+        if tool_result.get("error") or namespace_changed:
+            return
+        size = _result_size(tool_result)
+        if size < 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = (dict(tool_result), size)
+            self._entries.move_to_end(key)
+            total = self.total_bytes
+            while self._entries and total > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                total -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_repl_memo() -> Optional[ReplMemo]:
+    """Process-wide memo shared by every session, or None unless REPL_MEMO is on."""
+    global _default_memo
+    if not REPL_MEMO:
+        return None
+    with _default_memo_lock:
+        if _default_memo is None:
+            _default_memo = ReplMemo()
+        return _default_memo
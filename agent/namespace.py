@@ -0,0 +1,185 @@
+"""Persistent per-session namespace for python_repl variables."""
+
+import ast
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from types import ModuleType
+
+import numpy as np
+import pandas as pd
+
+from .config import REPL_NAMESPACE_MAX_BYTES
+
+# Names python_repl injects fresh on every call; they are never persisted.
+RESERVED_NAMES = frozenset(
+    {
+        "__builtins__",
+        "df",
+        "pd",
+        "px",
+        "go",
+        "pio",
+        "sklearn",
+        "sm",
+        "plotly_figures",
+        "result",
+        "sheets",
+        "dataset",
+        "df_stats",
+    }
+)
+
+# Builtins through which code can reach variables without naming them.
+_DYNAMIC_ACCESS = frozenset({"globals", "locals", "vars", "eval", "exec", "dir"})
+
+_MISSING = object()
+
+
+def estimate_size(value) -> int:
+    """Rough in-memory size of a namespace value, in bytes."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+
+    size = sys.getsizeof(value)
+    # Fitted estimators keep their weights as array attributes one level down.
+    for attribute in getattr(value, "__dict__", {}).values():
+        if isinstance(attribute, (np.ndarray, pd.DataFrame, pd.Series)):
+            size += estimate_size(attribute)
+    return size
+
+
+def referenced_names(code: str) -> set[str]:
+    """Names a code string reads, used to refresh LRU order on each call."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+class ReplNamespace:
+    """Variables defined by model code, kept across tool calls with LRU eviction."""
+
+    def __init__(self, max_bytes: int = REPL_NAMESPACE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # Versions count per instance; the uid tells instances apart.
+        self.uid = uuid.uuid4().hex
+        self.version = 0
+        self.evictions = 0
+        self._values: OrderedDict[str, object] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def bindings(self, code: str = "") -> dict:
+        """Snapshot of persisted variables, touching the ones `code` references."""
+        with self._lock:
+            for name in referenced_names(code) & self._values.keys():
+                self._values.move_to_end(name)
+            return dict(self._values)
+
+    def references(self, code: str) -> bool:
+        """Whether `code` can read or change (even in place) a persisted variable."""
+        names = referenced_names(code)
+        if names & _DYNAMIC_ACCESS:
+            return True
+        with self._lock:
+            return not names.isdisjoint(self._values)
+
+    def referenced_bindings(self, code: str) -> dict:
+        """
+        Persisted variables `code` can reach, for shipping to another process.
+
+        Only the names the code mentions, unless it looks names up dynamically
+        (globals(), eval, ...), in which case everything is returned.
+        """
+        names = referenced_names(code)
+        if names & _DYNAMIC_ACCESS:
+            return self.bindings(code)
+        with self._lock:
+            for name in names & self._values.keys():
+                self._values.move_to_end(name)
+            return {
+                name: value for name, value in self._values.items() if name in names
+            }
+
+    def absorb(self, env_vars: dict, previous: dict | None = None) -> list[str]:
+        """
+        Persist user variables from an execution environment.
+
+        Args:
+            env_vars: The exec() globals after the code ran
+            previous: The bindings that were injected before the run, so
+                variables deleted by the code are dropped here too
+
+        Returns:
+            Sorted names of the variables available to the next call
+        """
+        with self._lock:
+            changed = False
+            for name in previous or {}:
+                if name not in env_vars and name in self._values:
+                    self._discard(name)
+                    changed = True
+
+            for name, value in env_vars.items():
+                if name in RESERVED_NAMES or name.startswith("__"):
+                    continue
+                if isinstance(value, ModuleType):
+                    continue
+                if self._values.get(name, _MISSING) is value:
+                    continue
+
+                size = estimate_size(value)
+                if size > self.max_bytes:
+                    self._discard(name)
+                    self.evictions += 1
+                    changed = True
+                    continue
+
+                self._values[name] = value
+                self._values.move_to_end(name)
+                self._sizes[name] = size
+                changed = True
+
+            while self._values and self.total_bytes > self.max_bytes:
+                name, _ = self._values.popitem(last=False)
+                self._sizes.pop(name, None)
+                self.evictions += 1
+
+            if changed:
+                self.version += 1
+            return sorted(self._values)
+
+    def clear(self):
+        with self._lock:
+            if self._values:
+                self.version += 1
+            self._values.clear()
+            self._sizes.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "variables": len(self._values),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "version": self.version,
+            }
+
+    def _discard(self, name: str):
+        self._values.pop(name, None)
+        self._sizes.pop(name, None)
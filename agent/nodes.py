@@ -1,13 +1,25 @@
 """LangGraph node functions for the data science agent."""
 
+import asyncio
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Callable
 
 from langchain_core.messages import SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
 
-from .config import MessagesStateWithTools, system_message
-from .helpers import _normalize_message_content, extract_code_and_thoughts, python_repl
+from .config import (
+    PARALLEL_TOOL_CALLS,
+    PARALLEL_TOOL_CALLS_MAX_WORKERS,
+    MessagesStateWithTools,
+    system_message,
+)
+from .executors import get_default_executor
+from .helpers import _normalize_message_content, extract_code_and_thoughts
+from .memo import get_repl_memo
+from .sql_engine import run_sql_query
 
 
 def _extract_message_content(message) -> str:
@@ -20,18 +32,34 @@ def _extract_message_content(message) -> str:
     return ""
 
 
-def create_agent_node(llm_with_tools) -> Callable[[MessagesStateWithTools], dict]:
-    def call_agent(state: MessagesStateWithTools) -> dict:
-        messages = state["messages"]
-        has_system = any(isinstance(m, SystemMessage) for m in messages)
+def _with_system_message(messages: list) -> list:
+    has_system = any(isinstance(m, SystemMessage) for m in messages)
+
+    if not has_system:
+        messages = [SystemMessage(content=system_message)] + messages
+
+    return messages
+
+
+def create_agent_node(llm_with_tools) -> RunnableLambda:
+    """
+    Agent node usable from both graph.invoke() and graph.ainvoke().
 
-        if not has_system:
-            messages = [SystemMessage(content=system_message)] + messages
+    The async variant awaits the LLM with ainvoke so a single event loop can
+    hold many sessions that are waiting on the model.
+    """
 
+    def call_agent(state: MessagesStateWithTools) -> dict:
+        messages = _with_system_message(state["messages"])
         response = llm_with_tools.invoke(messages)
         return {"messages": [response]}
 
-    return call_agent
+    async def acall_agent(state: MessagesStateWithTools) -> dict:
+        messages = _with_system_message(state["messages"])
+        response = await llm_with_tools.ainvoke(messages)
+        return {"messages": [response]}
+
+    return RunnableLambda(call_agent, afunc=acall_agent, name="call_agent")
 
 
 def should_continue(state: MessagesStateWithTools) -> str:
@@ -56,15 +84,142 @@ def should_continue(state: MessagesStateWithTools) -> str:
     return "store_response"
 
 
-def tools_node(state: MessagesStateWithTools, df) -> dict:
+def _run_tool_call(
+    tc, last_message, df, namespace, executor, extra_globals=None, dataset_key=None
+) -> tuple[dict, ToolMessage]:
+    """Execute one tool call and build its tool_result entry and ToolMessage."""
+    name = tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", None)
+    tool_call_id = (
+        tc.get("id") if isinstance(tc, dict) else getattr(tc, "id", str(uuid.uuid4()))
+    )
+
+    code, thoughts = extract_code_and_thoughts(last_message, tc)
+    code = code or ""
+    thoughts = thoughts or ""
+
+    started = time.perf_counter()
+    if name == "python_repl":
+        memo = get_repl_memo()
+        memo_key = memo.key(dataset_key, code, namespace) if memo is not None else None
+        tool_result = memo.get(memo_key) if memo_key else None
+        if tool_result is None:
+            namespace_version = namespace.version if namespace is not None else None
+            tool_result = executor.execute(
+                code=code,
+                thoughts=thoughts,
+                df=df,
+                namespace=namespace,
+                extra_globals=extra_globals,
+            )
+            if memo_key:
+                memo.put(
+                    memo_key,
+                    tool_result,
+                    namespace_changed=namespace is not None
+                    and namespace.version != namespace_version,
+                )
+    elif name == "sql_query":
+        # DuckDB releases the GIL and scans the session frame in place, so
+        # queries run here rather than being shipped to an executor backend.
+        tool_result = run_sql_query(
+            query=code,
+            df=df,
+            extra_globals=extra_globals,
+            namespace=namespace,
+            limits=getattr(executor, "limits", None),
+        )
+    else:
+        tool_result = {
+            "stdout": "",
+            "result": None,
+            "figures": [],
+            "error": f"Unknown tool: {name}",
+            "error_type": "unknown_tool",
+        }
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    # Store the raw result for later display formatting
+    normalized = {
+        "type": "tool_result",
+        "tool": name,
+        "code": code,
+        "stdout": tool_result.get("stdout", "") or "",
+        "result": tool_result.get("result", None),
+        "figures": tool_result.get("figures", []) or [],
+        "error": tool_result.get("error", None),
+        "error_type": tool_result.get("error_type", None),
+        "memoized": tool_result.get("memoized", False),
+        "duration_ms": round(duration_ms, 2),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+    # Format the result as a readable string for the LLM
+    result_parts = []
+
+    if tool_result.get("stdout"):
+        result_parts.append(f"STDOUT:\n{tool_result['stdout']}")
+
+    if tool_result.get("result") is not None:
+        result_parts.append(f"RESULT:\n{tool_result['result']}")
+
+    if tool_result.get("figures"):
+        for figure_payload in tool_result["figures"]:
+            figure_label = figure_payload.get("title") or figure_payload.get("id")
+            downsampled = figure_payload.get("downsampled")
+            if downsampled:
+                figure_label += (
+                    f" (downsampled to {downsampled['points_after']:,} of "
+                    f"{downsampled['points_before']:,} points for display)"
+                )
+            result_parts.append(f"FIGURE GENERATED: {figure_label}")
+
+    if tool_result.get("error"):
+        error_type = tool_result.get("error_type")
+        label = f"ERROR ({error_type})" if error_type else "ERROR"
+        result_parts.append(f"{label}:\n{tool_result['error']}")
+
+    if tool_result.get("variables"):
+        result_parts.append(
+            "VARIABLES KEPT FOR NEXT CALL: " + ", ".join(tool_result["variables"])
+        )
+
+    content = (
+        "\n\n".join(result_parts)
+        if result_parts
+        else "Tool execution completed successfully."
+    )
+
+    # Create ToolMessage so the LLM can see the results
+    tool_msg = ToolMessage(content=content, tool_call_id=tool_call_id, name=name)
+    return normalized, tool_msg
+
+
+def tools_node(
+    state: MessagesStateWithTools,
+    df,
+    namespace=None,
+    executor=None,
+    extra_globals=None,
+    dataset_key=None,
+) -> dict:
     """
-    Look at the last LLM message for tool_calls and execute them in order.
+    Look at the last LLM message for tool_calls and execute them.
     Store raw tool_result dicts in state["tool_results"] for later formatting.
     Return ToolMessages so the LLM can see the results.
 
+    Independent calls of one step run concurrently when PARALLEL_TOOL_CALLS
+    is enabled. With a persistent namespace a later call may read variables
+    an earlier one defines, so those steps always run sequentially. Results
+    and ToolMessages keep the order of the original tool_calls either way.
+
     Args:
         state: Current state with messages and tool_results
         df: The pandas DataFrame to pass to python_repl
+        namespace: Optional ReplNamespace that persists variables across calls
+        executor: Backend that runs the code (defaults to the process-wide one)
+        extra_globals: Session-specific names bound next to `df` (e.g. `sheets`)
+        dataset_key: Hash of the uploaded dataset, keying memoized results
+            when REPL_MEMO is enabled
 
     Returns:
         Dictionary with messages (ToolMessages) and updated tool_results
@@ -98,82 +253,70 @@ def tools_node(state: MessagesStateWithTools, df) -> dict:
             }
         )
 
-    tool_messages = []
-    for tc in tool_calls:
-        name = tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", None)
-        tool_call_id = (
-            tc.get("id")
-            if isinstance(tc, dict)
-            else getattr(tc, "id", str(uuid.uuid4()))
-        )
-
-        code, thoughts = extract_code_and_thoughts(last_message, tc)
-        code = code or ""
-        thoughts = thoughts or ""
-
-        if name == "python_repl":
-            tool_result = python_repl(code=code, thoughts=thoughts, df=df)
-        else:
-            tool_result = {
-                "stdout": "",
-                "result": None,
-                "figures": [],
-                "error": f"Unknown tool: {name}",
-            }
-
-        # Store the raw result for later display formatting
-        normalized = {
-            "type": "tool_result",
-            "tool": name,
-            "code": code,
-            "stdout": tool_result.get("stdout", "") or "",
-            "result": tool_result.get("result", None),
-            "figures": tool_result.get("figures", []) or [],
-            "error": tool_result.get("error", None),
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-        }
-        tool_results.append(normalized)
-
-        # Format the result as a readable string for the LLM
-        result_parts = []
-
-        if tool_result.get("stdout"):
-            result_parts.append(f"STDOUT:\n{tool_result['stdout']}")
-
-        if tool_result.get("result") is not None:
-            result_parts.append(f"RESULT:\n{tool_result['result']}")
+    executor = executor or get_default_executor()
 
-        if tool_result.get("figures"):
-            for figure_payload in tool_result["figures"]:
-                figure_label = figure_payload.get("title") or figure_payload.get("id")
-                result_parts.append(f"FIGURE GENERATED: {figure_label}")
-
-        if tool_result.get("error"):
-            result_parts.append(f"ERROR:\n{tool_result['error']}")
-
-        content = (
-            "\n\n".join(result_parts)
-            if result_parts
-            else "Tool execution completed successfully."
+    def run(tc):
+        return _run_tool_call(
+            tc, last_message, df, namespace, executor, extra_globals, dataset_key
         )
 
-        # Create ToolMessage so the LLM can see the results
-        tool_msg = ToolMessage(content=content, tool_call_id=tool_call_id, name=name)
+    parallel = PARALLEL_TOOL_CALLS and namespace is None and len(tool_calls) > 1
+    started = time.perf_counter()
+    if parallel:
+        max_workers = min(len(tool_calls), PARALLEL_TOOL_CALLS_MAX_WORKERS)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            outcomes = list(pool.map(run, tool_calls))
+    else:
+        outcomes = [run(tc) for tc in tool_calls]
+    step_duration_ms = (time.perf_counter() - started) * 1000
 
+    tool_messages = []
+    for normalized, tool_msg in outcomes:
+        tool_results.append(normalized)
         tool_messages.append(tool_msg)
+
+    tool_results.append(
+        {
+            "type": "tool_step",
+            "tool_calls": len(tool_calls),
+            "parallel": parallel,
+            "duration_ms": round(step_duration_ms, 2),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+    )
     return {"messages": tool_messages, "tool_results": tool_results}
 
 
 def create_tools_node(
     df_getter: Callable[[], object],
-) -> Callable[[MessagesStateWithTools], dict]:
+    namespace_getter: Callable[[], object] | None = None,
+    executor=None,
+    extra_globals_getter: Callable[[], dict] | None = None,
+    dataset_key_getter: Callable[[], str | None] | None = None,
+) -> RunnableLambda:
     def tools_node_wrapper(state: MessagesStateWithTools) -> dict:
         df = df_getter()
         if df is None:
             raise ValueError("DataFrame not provided for tool execution")
-        return tools_node(state, df)
+        namespace = namespace_getter() if namespace_getter else None
+        extra_globals = extra_globals_getter() if extra_globals_getter else None
+        dataset_key = dataset_key_getter() if dataset_key_getter else None
+        return tools_node(
+            state,
+            df,
+            namespace=namespace,
+            executor=executor,
+            extra_globals=extra_globals,
+            dataset_key=dataset_key,
+        )
+
+    async def atools_node_wrapper(state: MessagesStateWithTools) -> dict:
+        # Code execution is CPU-bound; keep it off the event loop.
+        return await asyncio.to_thread(tools_node_wrapper, state)
 
-    return tools_node_wrapper
+    return RunnableLambda(
+        tools_node_wrapper, afunc=atools_node_wrapper, name="tools_node"
+    )
 
 
 def store_response(state: MessagesStateWithTools) -> dict:
@@ -0,0 +1,296 @@
+"""Datasets larger than RAM, stored as partitioned Parquet and queried lazily."""
+
+import os
+import shutil
+import threading
+from typing import Iterator, Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from .config import (
+    OUT_OF_CORE_DIR,
+    OUT_OF_CORE_MAX_BYTES,
+    OUT_OF_CORE_MEMORY_LIMIT_MB,
+    OUT_OF_CORE_ROWS_PER_FILE,
+    OUT_OF_CORE_SAMPLE_ROWS,
+)
+
+OUT_OF_CORE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".feather": "ipc",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+}
+
+# Written last, so a directory without it is a crashed or running conversion.
+_COMPLETE_MARKER = "_SUCCESS"
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _ipc_source(source: str):
+    """
+    A dataset or record batch reader over an Arrow IPC file.
+
+    .arrow/.ipc files may hold the streaming format, which Arrow datasets
+    (random-access files only) reject.
+    """
+    try:
+        return ds.dataset(source, format="ipc")
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.memory_map(source))
+
+
+class OutOfCoreDataset:
+    """
+    A dataset kept on disk as Parquet partitions instead of in a DataFrame.
+
+    python_repl sees it as `dataset`, next to a random-sample `df`:
+      - dataset.sql("SELECT ... FROM data ...") runs DuckDB over every row
+        and returns a DataFrame; DuckDB streams the files and spills to disk,
+        so aggregates over files far larger than RAM work.
+      - dataset.iter_batches(columns=[...]) yields pandas chunks for logic
+        SQL can't express.
+    Holds no open handles when pickled, so worker processes get a copy that
+    opens its own DuckDB connection.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._pattern = os.path.join(directory, "*.parquet")
+        self._arrow = ds.dataset(directory, format="parquet")
+        self.num_rows = self._arrow.count_rows()
+        self.schema = self._arrow.schema
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def convert(cls, source: str, filename: str, directory: str) -> "OutOfCoreDataset":
+        """
+        Stream an uploaded file into Parquet partitions under `directory`.
+
+        A finished conversion of the same content is reused as-is.
+        """
+        marker = os.path.join(directory, _COMPLETE_MARKER)
+        if os.path.exists(marker):
+            os.utime(marker)  # recently used, for prune_out_of_core()
+            return cls(directory)
+
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in OUT_OF_CORE_FORMATS:
+            raise ValueError(
+                "Out-of-core mode supports these file types: "
+                + ", ".join(sorted(ext.lstrip(".") for ext in OUT_OF_CORE_FORMATS))
+            )
+
+        row_group_size = min(OUT_OF_CORE_ROWS_PER_FILE, 1_000_000)
+        row_groups_per_file = -(-OUT_OF_CORE_ROWS_PER_FILE // row_group_size)
+        tmp_directory = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        os.makedirs(tmp_directory)
+        try:
+            if extension == ".csv":
+                # DuckDB's CSV sniffer samples the whole file for types, where
+                # Arrow would infer from the first block and fail later on.
+                with duckdb.connect() as connection:
+                    cls._configure(connection)
+                    connection.execute(
+                        f"COPY (SELECT * FROM read_csv({_sql_literal(source)})) "
+                        f"TO {_sql_literal(tmp_directory)} (FORMAT parquet, "
+                        f"ROW_GROUP_SIZE {row_group_size}, "
+                        f"ROW_GROUPS_PER_FILE {row_groups_per_file})"
+                    )
+            else:
+                data_format = OUT_OF_CORE_FORMATS[extension]
+                ds.write_dataset(
+                    (
+                        _ipc_source(source)
+                        if data_format == "ipc"
+                        else ds.dataset(source, format=data_format)
+                    ),
+                    tmp_directory,
+                    format="parquet",
+                    basename_template="part-{i}.parquet",
+                    max_rows_per_file=OUT_OF_CORE_ROWS_PER_FILE,
+                    max_rows_per_group=row_group_size,
+                    existing_data_behavior="overwrite_or_ignore",
+                )
+            open(os.path.join(tmp_directory, _COMPLETE_MARKER), "w").close()
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(tmp_directory, directory)
+        except (duckdb.Error, pa.ArrowException) as e:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise ValueError(f"Could not convert {filename}: {e}") from e
+        except BaseException:
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+            raise
+        return cls(directory)
+
+    @staticmethod
+    def _configure(connection):
+        connection.execute(f"SET memory_limit = '{OUT_OF_CORE_MEMORY_LIMIT_MB}MB'")
+        connection.execute(
+            f"SET temp_directory = {_sql_literal(os.path.join(OUT_OF_CORE_DIR, 'spill'))}"
+        )
+
+    def _cursor(self):
+        with self._lock:
+            if self._connection is None:
+                connection = duckdb.connect()
+                self._configure(connection)
+                connection.execute(
+                    "CREATE VIEW data AS SELECT * FROM read_parquet("
+                    f"{_sql_literal(self._pattern)})"
+                )
+                self._connection = connection
+            # Cursors share the database but are safe to use from one thread each.
+            return self._connection.cursor()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_lock"] = None
+        state["_arrow"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._arrow = ds.dataset(self.directory, format="parquet")
+
+    def __repr__(self) -> str:
+        return (
+            f"<dataset: {self.num_rows:,} rows x {len(self.columns)} columns on disk; "
+            "use dataset.sql('SELECT ... FROM data') or dataset.iter_batches()>"
+        )
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self.schema.names)
+
+    @property
+    def dtypes(self) -> dict[str, str]:
+        return {field.name: str(field.type) for field in self.schema}
+
+    @property
+    def arrow_dataset(self) -> ds.Dataset:
+        """The partitions as a pyarrow Dataset (e.g. to register with DuckDB)."""
+        return self._arrow
+
+    @property
+    def nbytes_on_disk(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.directory, name))
+            for name in os.listdir(self.directory)
+        )
+
+    def sql(self, query: str) -> pd.DataFrame:
+        """Run a DuckDB query over every row; the table is called `data`."""
+        cursor = self._cursor()
+        try:
+            return cursor.execute(query).df()
+        finally:
+            cursor.close()
+
+    def iter_batches(
+        self,
+        columns: Optional[list[str]] = None,
+        batch_size: int = 1_000_000,
+    ) -> Iterator[pd.DataFrame]:
+        """Yield the dataset as pandas chunks of at most `batch_size` rows."""
+        for batch in self._arrow.to_batches(columns=columns, batch_size=batch_size):
+            yield batch.to_pandas()
+
+    def sample(self, rows: int = OUT_OF_CORE_SAMPLE_ROWS) -> pd.DataFrame:
+        """Uniform random sample of `rows` rows (one streaming pass)."""
+        if self.num_rows <= rows:
+            return self.sql("SELECT * FROM data")
+        # Reservoir sampling picks rows, not row groups: block sampling can
+        # return nothing for small inputs and clusters on sorted files.
+        return self.sql(
+            f"SELECT * FROM data USING SAMPLE reservoir({int(rows)} ROWS) "
+            "REPEATABLE (42)"
+        )
+
+    def for_execution(self, code: str, portable: bool = False):
+        return self
+
+    def describe(self, sample_rows: int) -> str:
+        """One-paragraph note telling the model how to use the dataset."""
+        if sample_rows >= self.num_rows:
+            return (
+                f"The uploaded dataset has {self.num_rows:,} rows, all in `df`; "
+                'it can also be queried with `dataset.sql("SELECT ... FROM data")`.'
+            )
+        return (
+            f"The uploaded dataset has {self.num_rows:,} rows and is too large "
+            f"for memory, so `df` holds a random sample of {sample_rows:,} rows. "
+            "Use `df` only to inspect columns and values. For counts, sums, "
+            "averages, group-bys and other exact results over all rows use "
+            '`dataset.sql("SELECT ... FROM data ...")` (DuckDB SQL, returns a '
+            "DataFrame) or iterate `dataset.iter_batches(columns=[...])`."
+        )
+
+
+def _directory_bytes(directory: str) -> int:
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def prune_out_of_core(
+    directory: str = OUT_OF_CORE_DIR,
+    max_bytes: int = OUT_OF_CORE_MAX_BYTES,
+    keep: Optional[str] = None,
+) -> list[str]:
+    """
+    Delete the least recently used conversions until `directory` fits.
+
+    Only finished conversions are considered, and never `keep`. A session
+    still using a deleted one fails its next query and needs a re-upload.
+
+    Returns:
+        The directories removed
+    """
+    if not max_bytes or not os.path.isdir(directory):
+        return []
+
+    conversions = []
+    for entry in os.scandir(directory):
+        marker = os.path.join(entry.path, _COMPLETE_MARKER)
+        if entry.is_dir() and os.path.exists(marker):
+            size = _directory_bytes(entry.path)
+            conversions.append((os.path.getmtime(marker), size, entry.path))
+
+    total = sum(size for _, size, _ in conversions)
+    removed = []
+    for _, size, path in sorted(conversions):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.samefile(path, keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def open_out_of_core(source: str, filename: str, sha256: str) -> OutOfCoreDataset:
+    """Convert (or reuse) the partitioned copy of an upload, keyed by its hash."""
+    os.makedirs(OUT_OF_CORE_DIR, exist_ok=True)
+    dataset = OutOfCoreDataset.convert(
+        source, filename, os.path.join(OUT_OF_CORE_DIR, sha256)
+    )
+    prune_out_of_core(keep=dataset.directory)
+    return dataset
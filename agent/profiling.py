@@ -0,0 +1,187 @@
+"""Compact dataset profiles handed to the model with the first question."""
+
+import pandas as pd
+import pyarrow as pa
+
+from .column_stats import ColumnStats
+from .config import PROFILE_MAX_COLUMNS, PROFILE_SAMPLE_ROWS
+
+# Longest cell text shown in sample rows and top values.
+_MAX_VALUE_CHARS = 40
+_TOP_VALUES = 3
+
+
+def _short(value) -> str:
+    text = str(value)
+    if len(text) > _MAX_VALUE_CHARS:
+        return text[: _MAX_VALUE_CHARS - 3] + "..."
+    return text
+
+
+def _summarize_column(stats: ColumnStats, name, column: pd.Series) -> tuple[int, str]:
+    """Number of distinct values and a one-line summary of a column."""
+    if pd.api.types.is_bool_dtype(column):
+        return stats.nunique(name), f"{int(column.sum()):,} true"
+    if pd.api.types.is_numeric_dtype(column):
+        summary = stats.describe(name)
+        if not summary["count"]:
+            return 0, "all null"
+        return stats.nunique(name), (
+            f"min {summary['min']:.4g}, mean {summary['mean']:.4g}, "
+            f"median {summary['50%']:.4g}, max {summary['max']:.4g}"
+        )
+    if pd.api.types.is_datetime64_any_dtype(column):
+        summary = stats.describe(name)
+        if not summary["count"]:
+            return 0, "all null"
+        return stats.nunique(name), f"{summary['min']} to {summary['max']}"
+
+    # The value counts give both the cardinality and the most frequent values.
+    counts = stats.value_counts(name)
+    top = counts.head(_TOP_VALUES)
+    if top.empty:
+        return 0, "all null"
+    if top.iloc[0] == 1:
+        examples = ", ".join(_short(value) for value in top.index)
+        return stats.nunique(name), f"all values distinct, e.g. {examples}"
+    return stats.nunique(name), "top " + ", ".join(
+        f"{_short(value)} ({count:,})" for value, count in top.items()
+    )
+
+
+def build_profile(
+    df: pd.DataFrame,
+    max_columns: int = PROFILE_MAX_COLUMNS,
+    sample_rows: int = PROFILE_SAMPLE_ROWS,
+    stats: ColumnStats | None = None,
+) -> dict:
+    """
+    Summarize a DataFrame in one pass over its columns.
+
+    Returns the row/column counts, per-column dtype, null count, number of
+    distinct values and a short summary (numeric range and mean, date range
+    or most frequent values), plus the first `sample_rows` rows. Only the
+    first `max_columns` columns are described in detail. Passing the
+    dataset's ColumnStats leaves the statistics cached for python_repl.
+    """
+    stats = stats or ColumnStats(df)
+    columns = []
+    for name, column in list(df.items())[:max_columns]:
+        try:
+            unique, summary = _summarize_column(stats, name, column)
+        except TypeError:
+            # Unhashable or mixed values (lists, dicts) can't be counted.
+            summary, unique = "mixed values", None
+        columns.append(
+            {
+                "name": str(name),
+                "dtype": str(column.dtype),
+                "nulls": stats.isna_sum(name),
+                "unique": unique,
+                "summary": summary,
+            }
+        )
+
+    sample = df.iloc[:sample_rows, :max_columns]
+    return {
+        "rows": len(df),
+        "columns": df.shape[1],
+        "column_names": [str(name) for name in df.columns],
+        "column_profiles": columns,
+        "sample": sample.map(_short).to_string(),
+    }
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build_out_of_core_profile(
+    dataset,
+    sample: pd.DataFrame,
+    max_columns: int = PROFILE_MAX_COLUMNS,
+    sample_rows: int = PROFILE_SAMPLE_ROWS,
+    stats: ColumnStats | None = None,
+) -> dict:
+    """
+    Profile an OutOfCoreDataset over all of its rows.
+
+    Row and null counts, numeric and date ranges and (approximate) distinct
+    counts come from one DuckDB aggregate over every partition. Only the
+    most frequent values of other columns and the shown rows come from the
+    in-memory `sample`, and are labelled as such.
+    """
+    profile = build_profile(sample, max_columns, sample_rows, stats)
+    fields = [dataset.schema.field(name) for name in dataset.columns[:max_columns]]
+
+    aggregates = []
+    for field in fields:
+        column = _quote_identifier(field.name)
+        aggregates += [f"count({column})", f"approx_count_distinct({column})"]
+        if pa.types.is_boolean(field.type):
+            aggregates.append(f"count_if({column})")
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            aggregates += [
+                f"min({column})",
+                f"avg({column})",
+                f"approx_quantile({column}, 0.5)",
+                f"max({column})",
+            ]
+        elif pa.types.is_temporal(field.type):
+            aggregates += [f"min({column})", f"max({column})"]
+    if not aggregates:
+        return profile
+    values = iter(dataset.sql(f"SELECT {', '.join(aggregates)} FROM data").iloc[0])
+
+    by_name = {column["name"]: column for column in profile["column_profiles"]}
+    for field in fields:
+        column = by_name.get(field.name)
+        count, unique = int(next(values)), int(next(values))
+        if column is None:
+            continue
+        column["nulls"] = dataset.num_rows - count
+        column["unique"] = min(unique, count)  # the estimate can overshoot
+        column["approximate_unique"] = True
+        if pa.types.is_boolean(field.type):
+            column["summary"] = f"{int(next(values)):,} true"
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            low, mean, median, high = (next(values) for _ in range(4))
+            column["summary"] = (
+                f"min {low:.4g}, mean {mean:.4g}, median {median:.4g}, max {high:.4g}"
+                if count
+                else "all null"
+            )
+        elif pa.types.is_temporal(field.type):
+            low, high = next(values), next(values)
+            column["summary"] = f"{low} to {high}" if count else "all null"
+        elif count:
+            column["summary"] += " (in the sample)"
+        else:
+            column["summary"] = "all null"
+
+    profile["rows"] = dataset.num_rows
+    profile["sample_of"] = len(sample)
+    return profile
+
+
+def format_profile(profile: dict) -> str:
+    """Render a profile as the plain-text block the model reads."""
+    lines = [f"{profile['rows']:,} rows x {profile['columns']} columns."]
+    for column in profile["column_profiles"]:
+        unique = "?" if column["unique"] is None else f"{column['unique']:,}"
+        if column.get("approximate_unique"):
+            unique = f"~{unique}"
+        lines.append(
+            f"- {column['name']} ({column['dtype']}): {column['nulls']:,} nulls, "
+            f"{unique} unique; {column['summary']}"
+        )
+
+    hidden = profile["column_names"][len(profile["column_profiles"]) :]
+    if hidden:
+        lines.append(f"Other columns: {', '.join(hidden)}")
+    if profile.get("sample_of"):
+        lines.append(f"First rows of a {profile['sample_of']:,}-row random sample:")
+    else:
+        lines.append("First rows:")
+    lines.append(profile["sample"])
+    return "\n".join(lines)
@@ -4,14 +4,38 @@ from datetime import datetime
 from io import BytesIO
 import hashlib
 import os
+import tempfile
+import uuid
+import weakref
+from typing import AsyncIterator, Iterator
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 from langchain_core.messages import AIMessage, HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
 
-from .config import DEFAULT_MODEL, build_llm_with_tools
+from .checkpoint import build_checkpointer, thread_memory_bytes
+from .column_stats import ColumnStats
+from .compaction import compact_dtypes
+from .datasets import get_dataset_cache
+from .config import (
+    ARROW_DTYPES,
+    COMPACT_DTYPES,
+    CSV_ENGINE,
+    DATASET_PROFILE,
+    DEFAULT_MODEL,
+    OUT_OF_CORE_THRESHOLD_BYTES,
+    REPL_PERSISTENT_NAMESPACE,
+    UPLOAD_SPOOL_DIR,
+    build_llm_with_tools,
+)
 from .graph import DataScienceGraph
-from .helpers import _normalize_message_content
+from .helpers import _normalize_message_content, extract_code_and_thoughts
+from .namespace import ReplNamespace
+from .out_of_core import OUT_OF_CORE_FORMATS, OutOfCoreDataset, open_out_of_core
+from .profiling import build_out_of_core_profile, build_profile, format_profile
+from .workbooks import LazySheets
 
 try:
     from langfuse.langchain import CallbackHandler
@@ -32,11 +56,18 @@ EXCEL_ENGINES = {
     ".odt": "odf",
 }
 
-SUPPORTED_UPLOAD_TYPES = ("csv", *[ext.lstrip(".") for ext in EXCEL_ENGINES])
+ARROW_EXTENSIONS = (".parquet", ".feather", ".arrow", ".ipc")
+
+SUPPORTED_UPLOAD_TYPES = (
+    "csv",
+    *[ext.lstrip(".") for ext in EXCEL_ENGINES],
+    *[ext.lstrip(".") for ext in ARROW_EXTENSIONS],
+)
 
 
 def build_thread_id(prefix: str = "session") -> str:
-    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    # The suffix keeps ids unique when sessions share one durable checkpointer.
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
 
 
 def get_figure_identifier(figure_payload) -> str:
@@ -47,6 +78,9 @@ def get_figure_identifier(figure_payload) -> str:
     if figure_id:
         return str(figure_id)
 
+    if figure_payload.get("sha256"):
+        return str(figure_payload["sha256"])
+
     figure_json = figure_payload.get("figure_json", "")
     if figure_json:
         return hashlib.sha256(figure_json.encode("utf-8")).hexdigest()
@@ -54,15 +88,71 @@ def get_figure_identifier(figure_payload) -> str:
     return ""
 
 
-def load_tabular_bytes(file_bytes: bytes, filename: str) -> pd.DataFrame:
+def _arrow_to_pandas(table: pa.Table) -> pd.DataFrame:
+    if ARROW_DTYPES:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    # split_blocks + self_destruct free each Arrow column as it is converted,
+    # so peak memory stays close to one copy of the data.
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _read_arrow_ipc(source) -> pa.Table:
+    if isinstance(source, (str, os.PathLike)):
+        # Memory-mapped: record batches are read straight from the page cache.
+        source = pa.memory_map(os.fspath(source))
+    # .arrow/.ipc files may hold either the random-access file format
+    # (Feather v2) or the streaming format.
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        _rewind(source)
+        return pa.ipc.open_stream(source).read_all()
+
+
+def _read_csv(source, engine: str = CSV_ENGINE) -> pd.DataFrame:
+    options = {"dtype_backend": "pyarrow"} if ARROW_DTYPES else {}
+    if engine == "pyarrow":
+        try:
+            return pd.read_csv(source, engine="pyarrow", **options)
+        except (pa.ArrowInvalid, ValueError):
+            # Ragged rows or odd quoting the Arrow reader refuses; retry in C.
+            _rewind(source)
+    return pd.read_csv(source, **options)
+
+
+def load_tabular_file(source, filename: str) -> pd.DataFrame:
+    """
+    Parse an uploaded table from a file path or binary file object.
+
+    Args:
+        source: Path of the spooled upload, or a seekable binary file object
+        filename: Original file name; its extension selects the reader
+
+    Returns:
+        The parsed DataFrame
+    """
     extension = os.path.splitext(filename)[1].lower()
-    buffer = BytesIO(file_bytes)
 
     if extension == ".csv":
-        return pd.read_csv(buffer)
+        return _read_csv(source)
 
     if extension in EXCEL_ENGINES:
-        return pd.read_excel(buffer, engine=EXCEL_ENGINES[extension])
+        return pd.read_excel(source, engine=EXCEL_ENGINES[extension])
+
+    try:
+        if extension == ".parquet":
+            return _arrow_to_pandas(pq.read_table(source))
+        if extension == ".feather":
+            return _arrow_to_pandas(feather.read_table(source))
+        if extension in (".arrow", ".ipc"):
+            return _arrow_to_pandas(_read_arrow_ipc(source))
+    except pa.ArrowException as e:
+        raise ValueError(f"Could not read {extension} file: {e}") from e
 
     raise ValueError(
         "Unsupported file type. Please upload one of: "
@@ -70,6 +160,56 @@ def load_tabular_bytes(file_bytes: bytes, filename: str) -> pd.DataFrame:
     )
 
 
+def load_tabular_bytes(file_bytes: bytes, filename: str) -> pd.DataFrame:
+    return load_tabular_file(BytesIO(file_bytes), filename)
+
+
+def _prepare_dataset(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Post-load pass run once per distinct upload, before it is cached."""
+    if not COMPACT_DTYPES:
+        return df, {}
+    df, report = compact_dtypes(df)
+    return df, {"compaction": report}
+
+
+def _load_out_of_core(dataset: OutOfCoreDataset) -> tuple[pd.DataFrame, dict]:
+    return dataset.sample(), {"dataset": dataset}
+
+
+def _compact_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    return compact_dtypes(df)[0]
+
+
+def _load_dataset(source, filename: str) -> tuple[pd.DataFrame, dict]:
+    """
+    Load an upload for the dataset cache.
+
+    Excel workbooks only parse their first sheet (the session's `df`); the
+    others are listed from the workbook metadata and parsed on first access
+    through the `sheets` mapping returned in the details.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in EXCEL_ENGINES:
+        return _prepare_dataset(load_tabular_file(source, filename))
+
+    # Spooled uploads are read from their path, not loaded into memory.
+    workbook = source if isinstance(source, (str, os.PathLike)) else source.getvalue()
+    try:
+        sheets = LazySheets(
+            workbook,
+            EXCEL_ENGINES[extension],
+            transform=_compact_sheet if COMPACT_DTYPES else None,
+        )
+    except Exception as e:
+        raise ValueError(f"Could not read {extension} workbook: {e}") from e
+    if not sheets.names:
+        raise ValueError("The uploaded workbook has no sheets")
+
+    df, info = _prepare_dataset(sheets.parse(sheets.names[0]))
+    sheets.seed(sheets.names[0], df)
+    return df, {**info, "sheets": sheets}
+
+
 def get_uploaded_file_signature(file_bytes: bytes, filename: str) -> dict:
     return {
         "name": filename,
@@ -78,6 +218,58 @@ def get_uploaded_file_signature(file_bytes: bytes, filename: str) -> dict:
     }
 
 
+class UploadSpool:
+    """
+    Spool an upload to a temporary file chunk by chunk, hashing as it goes.
+
+    Only one chunk is in memory at a time, and the SHA-256 used for the file
+    signature is ready when the last chunk is written, so the file is never
+    read twice. Use as a context manager; the file is removed on exit.
+    """
+
+    def __init__(self, filename: str, directory: str | None = UPLOAD_SPOOL_DIR):
+        self.filename = filename
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(
+            dir=directory,
+            prefix="upload_",
+            suffix=os.path.splitext(filename)[1].lower(),
+            delete=False,
+        )
+        self.path = self._file.name
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def signature(self) -> dict:
+        return {
+            "name": self.filename,
+            "size": self.size,
+            "sha256": self._sha256.hexdigest(),
+        }
+
+    def __enter__(self) -> "UploadSpool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return False
+
+
 def extract_final_answer(new_tool_results: list[dict], new_messages=None) -> str:
     # Tier 1 — preferred: the ai_message stored by store_response is always
     # the correct final answer for this turn and is never stale.
@@ -100,11 +292,29 @@ def extract_final_answer(new_tool_results: list[dict], new_messages=None) -> str
 class AgentSession:
     """Per-session runtime container with no module-level mutable state."""
 
-    def __init__(self, api_key: str | None = None, model: str = DEFAULT_MODEL):
+    def __init__(
+        self,
+        api_key: str | None = None,
+        model: str = DEFAULT_MODEL,
+        persistent_namespace: bool = REPL_PERSISTENT_NAMESPACE,
+        executor=None,
+        out_of_core: bool | None = None,
+    ):
         self.api_key = api_key
         self.model = model
         self.df = None
-        self.memory = MemorySaver()
+        # None picks out-of-core mode by upload size (OUT_OF_CORE_THRESHOLD_BYTES).
+        self.out_of_core = out_of_core
+        self.dataset = None
+        self.df_stats = None
+        self.dataset_profile = None
+        self.dataset_key = None
+        self._dataset_finalizer = None
+        self.dtype_compaction = None
+        self.sheets = None
+        self.namespace = ReplNamespace() if persistent_namespace else None
+        self.executor = executor
+        self.memory = build_checkpointer()
         self.llm_with_tools = None
         self.graph = None
         self.thread_id = build_thread_id()
@@ -112,6 +322,7 @@ class AgentSession:
         self.last_tool_results = []
         self.uploaded_file_signature = None
         self.figures = []
+        self.df_bytes = 0
 
         if api_key:
             self.set_api_key(api_key, model=model)
@@ -125,8 +336,45 @@ class AgentSession:
             llm_with_tools=self.llm_with_tools,
             df_getter=lambda: self.df,
             memory=self.memory,
+            namespace_getter=lambda: self.namespace,
+            extra_globals_getter=self._repl_globals,
+            dataset_key_getter=lambda: self.dataset_key,
+            executor=self.executor,
         )
 
+    def _repl_globals(self) -> dict:
+        """Session-specific names python_repl binds next to `df`."""
+        extra_globals = {}
+        if self.df_stats is not None:
+            extra_globals["df_stats"] = self.df_stats
+        if self.sheets:
+            extra_globals["sheets"] = self.sheets
+        if self.dataset is not None:
+            extra_globals["dataset"] = self.dataset
+        return extra_globals
+
+    def _dataset_note(self) -> str:
+        """What the model knows about the data before its first tool call."""
+        parts = []
+        if self.dataset_profile:
+            parts.append(format_profile(self.dataset_profile))
+        if self.sheets:
+            parts.append(
+                f"Workbook sheets: {', '.join(self.sheets)}; "
+                f"`df` is {next(iter(self.sheets))!r}."
+            )
+        if self.dataset is not None:
+            parts.append(self.dataset.describe(len(self.df)))
+        return "\n\n".join(parts)
+
+    def _build_input(self, query: str) -> dict:
+        # The profile only goes into the first turn; the checkpointed history
+        # carries it into later ones.
+        note = self._dataset_note()
+        if note and len(self.messages) <= 1:
+            query = f"[Dataset profile]\n{note}\n[/Dataset profile]\n\n{query}"
+        return {"messages": [HumanMessage(content=query)]}
+
     def set_api_key(self, api_key: str, model: str | None = None):
         self.api_key = api_key
         if model:
@@ -135,42 +383,253 @@ class AgentSession:
         self.llm_with_tools = build_llm_with_tools(api_key=api_key, model=self.model)
         self._rebuild_graph()
 
+    def _use_out_of_core(self, file_signature: dict) -> bool:
+        if self.out_of_core is not None:
+            return self.out_of_core
+        extension = os.path.splitext(file_signature["name"])[1].lower()
+        return bool(
+            OUT_OF_CORE_THRESHOLD_BYTES
+            and extension in OUT_OF_CORE_FORMATS
+            and file_signature["size"] >= OUT_OF_CORE_THRESHOLD_BYTES
+        )
+
     def load_uploaded_file(self, file_bytes: bytes, filename: str):
         file_signature = get_uploaded_file_signature(file_bytes, filename)
+        if self._use_out_of_core(file_signature):
+            # The Parquet conversion reads from a path.
+            with UploadSpool(filename) as spool:
+                spool.write(file_bytes)
+                spool.close()
+                return self.load_uploaded_path(spool.path, file_signature)
+
+        return self._set_dataset(
+            file_signature,
+            lambda: _load_dataset(BytesIO(file_bytes), filename),
+        )
+
+    def load_uploaded_path(self, path: str, file_signature: dict):
+        """Load a spooled upload from disk (see UploadSpool) without buffering it."""
+        if self._use_out_of_core(file_signature):
+            return self._set_dataset(
+                file_signature,
+                lambda: _load_out_of_core(
+                    open_out_of_core(
+                        path, file_signature["name"], file_signature["sha256"]
+                    )
+                ),
+                key=f"{file_signature['sha256']}:out-of-core",
+            )
+
+        return self._set_dataset(
+            file_signature,
+            lambda: _load_dataset(path, file_signature["name"]),
+        )
+
+    def _acquire_dataset(self, file_signature: dict, loader, key: str | None = None):
+        # Identical uploads across sessions share one parsed, read-only frame.
+        key = key or file_signature["sha256"]
+        cache = get_dataset_cache()
+        df, df_bytes, info = cache.acquire(key, loader)
+        self.release_dataset()
+        self.dataset_key = key
+        # Sessions nobody close()s (Streamlit's, when the tab goes away) still
+        # give their reference back once garbage collected.
+        self._dataset_finalizer = weakref.finalize(self, cache.release_later, key)
+        self.df = df
+        self.df_bytes = df_bytes
+        if info.get("compaction"):
+            self.dtype_compaction = info["compaction"]
+        self.sheets = info.get("sheets")
+        self.dataset = info.get("dataset")
+        # Both live with the cached entry: one per distinct upload, shared by
+        # every session using it.
+        if "stats" not in info:
+            info["stats"] = ColumnStats(df)
+        self.df_stats = info["stats"]
+        if DATASET_PROFILE and "profile" not in info:
+            if self.dataset is not None:
+                info["profile"] = build_out_of_core_profile(
+                    self.dataset, df, stats=self.df_stats
+                )
+            else:
+                info["profile"] = build_profile(df, stats=self.df_stats)
+        self.dataset_profile = info.get("profile")
+
+    def release_dataset(self):
+        """Drop this session's reference to its cached DataFrame."""
+        if self.dataset_key is not None:
+            self._dataset_finalizer.detach()
+            self._dataset_finalizer = None
+            get_dataset_cache().release(self.dataset_key)
+            self.dataset_key = None
+        self.df = None
+        self.df_bytes = 0
+        self.dtype_compaction = None
+        self.sheets = None
+        self.dataset = None
+        self.df_stats = None
+        self.dataset_profile = None
+
+    def close(self):
+        """Release everything held outside this object (cached data, checkpoints)."""
+        self.release_dataset()
+        self.discard_checkpoints()
+
+    def _set_dataset(self, file_signature: dict, loader, key: str | None = None):
         file_changed = file_signature != self.uploaded_file_signature
 
-        self.df = load_tabular_bytes(file_bytes, filename)
+        self._acquire_dataset(file_signature, loader, key=key)
         self.uploaded_file_signature = file_signature
 
+        # Persisted variables were derived from the previous frame.
+        if self.namespace is not None:
+            self.namespace.clear()
+
         if file_changed:
             self.clear_memory()
 
         return {
             "file_signature": file_signature,
             "file_changed": file_changed,
+            "dtype_compaction": self.dtype_compaction,
+            "sheets": list(self.sheets) if self.sheets else None,
+            "profile": self.dataset_profile,
+            "out_of_core": (
+                {
+                    "rows": self.dataset.num_rows,
+                    "sample_rows": len(self.df),
+                    "bytes_on_disk": self.dataset.nbytes_on_disk,
+                }
+                if self.dataset is not None
+                else None
+            ),
         }
 
     def clear_memory(self):
-        self.memory = MemorySaver()
+        self.discard_checkpoints()
         self.thread_id = build_thread_id()
         self.messages = []
         self.last_tool_results = []
         self.figures = []
+        if self.namespace is not None:
+            self.namespace.clear()
         self._rebuild_graph()
 
+    def discard_checkpoints(self):
+        """Delete this session's LangGraph checkpoints from its checkpointer."""
+        self.memory.delete_thread(self.thread_id)
+
+    def snapshot(self) -> dict:
+        """
+        JSON-serializable state needed to rebuild this session in another
+        process. The API key is left out; stores that can protect it pass it
+        back to from_snapshot() as "api_key".
+        """
+        return {
+            "model": self.model,
+            "persistent_namespace": self.namespace is not None,
+            "thread_id": self.thread_id,
+            "messages": self.messages,
+            "figures": self.figures,
+            "last_tool_results": self.last_tool_results,
+            "uploaded_file_signature": self.uploaded_file_signature,
+            "df_bytes": self.df_bytes,
+            "dtype_compaction": self.dtype_compaction,
+            "out_of_core": self.out_of_core,
+            "out_of_core_dir": self.dataset.directory if self.dataset else None,
+        }
+
+    @classmethod
+    def from_snapshot(
+        cls, snapshot: dict, dataset_loader=None, memory=None
+    ) -> "AgentSession":
+        """
+        Rebuild a session from snapshot() output.
+
+        Args:
+            snapshot: Output of snapshot()
+            dataset_loader: Callable returning the uploaded DataFrame; only
+                called if the dataset cache doesn't hold it already
+            memory: Checkpointer holding the session's LangGraph state
+        """
+        session = cls(
+            model=snapshot["model"],
+            persistent_namespace=snapshot["persistent_namespace"],
+            out_of_core=snapshot.get("out_of_core"),
+        )
+        signature = snapshot["uploaded_file_signature"]
+        out_of_core_dir = snapshot.get("out_of_core_dir")
+        if out_of_core_dir and os.path.isdir(out_of_core_dir):
+            session._acquire_dataset(
+                signature,
+                lambda: _load_out_of_core(OutOfCoreDataset(out_of_core_dir)),
+                key=f"{signature['sha256']}:out-of-core",
+            )
+        elif out_of_core_dir:
+            # The Parquet copy was pruned or lives on another host; the
+            # session has no data until the file is uploaded again.
+            signature = None
+        elif dataset_loader is not None and signature:
+            session._acquire_dataset(signature, dataset_loader)
+        if snapshot.get("dtype_compaction"):
+            session.dtype_compaction = snapshot["dtype_compaction"]
+        if memory is not None:
+            session.memory = memory
+        session.thread_id = snapshot["thread_id"]
+        session.messages = snapshot["messages"]
+        session.figures = snapshot["figures"]
+        session.last_tool_results = snapshot["last_tool_results"]
+        session.uploaded_file_signature = signature
+
+        if snapshot.get("api_key"):
+            session.set_api_key(snapshot["api_key"])
+        return session
+
+    def memory_usage(self) -> int:
+        """
+        Approximate bytes held by this session: its share of the cached
+        dataset, figures, history, persisted variables and the checkpointer's
+        state for its thread.
+        """
+        figure_bytes = sum(
+            len(figure_payload.get("figure_json", ""))
+            for figure_payload in self.figures
+            if isinstance(figure_payload, dict)
+        )
+        message_bytes = sum(len(str(m.get("content", ""))) for m in self.messages)
+        namespace_bytes = self.namespace.total_bytes if self.namespace else 0
+        checkpoint_bytes = thread_memory_bytes(self.memory, self.thread_id)
+        # The frame belongs to the dataset cache and may be shared; charging
+        # it in full to every holder would count it once per session.
+        df_bytes = (
+            get_dataset_cache().share_bytes(self.dataset_key)
+            if self.dataset_key is not None
+            else 0
+        )
+        return (
+            df_bytes + figure_bytes + message_bytes + namespace_bytes + checkpoint_bytes
+        )
+
+    def find_figure(self, figure_id: str) -> dict | None:
+        """Payload of one of this session's figures, by id."""
+        for figure_payload in reversed(self.figures):
+            if get_figure_identifier(figure_payload) == figure_id:
+                return figure_payload
+        return None
+
     def _register_new_figures(self, figure_payloads: list[dict]) -> list[dict]:
         for figure_payload in figure_payloads:
             self.figures.append(figure_payload)
 
         return figure_payloads
 
-    def run(
+    def _prepare_run(
         self,
         query: str,
-        thread_id: str | None = None,
-        recursion_limit: int = 100,
-        langfuse_handler=None,
-    ):
+        thread_id: str | None,
+        recursion_limit: int,
+        langfuse_handler,
+    ) -> dict:
         if self.df is None:
             raise ValueError("DataFrame not set for this session")
         if self.graph is None:
@@ -186,6 +645,10 @@ class AgentSession:
             "callbacks": callbacks,
         }
 
+        self.messages.append({"role": "user", "content": query})
+        return config
+
+    def _reset_tool_results(self, config: dict):
         # Clear tool_results from previous queries in the same session
         try:
             self.graph.compiled_graph.update_state(config, {"tool_results": None})
@@ -193,30 +656,39 @@ class AgentSession:
             # First run might not have state
             pass
 
-        self.messages.append({"role": "user", "content": query})
-
-        hit_recursion_limit = False
+    async def _areset_tool_results(self, config: dict):
         try:
-            result = self.graph.invoke(
-                {"messages": [HumanMessage(content=query)]},
-                config=config,
+            await self.graph.compiled_graph.aupdate_state(
+                config, {"tool_results": None}
             )
-        except Exception as e:
-            # Catch GraphRecursionError regardless of the exact import path —
-            # LangGraph changed the exception location across versions.
-            if (
-                "recursion" not in type(e).__name__.lower()
-                and "recursion limit" not in str(e).lower()
-            ):
-                raise
-            hit_recursion_limit = True
-            # Salvage whatever partial state was checkpointed before the cutoff.
-            try:
-                partial_state = self.graph.get_state(config)
-                result = partial_state.values if partial_state.values else {}
-            except Exception:
-                result = {}
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_recursion_error(error: Exception) -> bool:
+        # Catch GraphRecursionError regardless of the exact import path —
+        # LangGraph changed the exception location across versions.
+        return (
+            "recursion" in type(error).__name__.lower()
+            or "recursion limit" in str(error).lower()
+        )
 
+    def _salvage_state(self, config: dict) -> dict:
+        # Salvage whatever partial state was checkpointed before the cutoff.
+        try:
+            partial_state = self.graph.get_state(config)
+            return partial_state.values if partial_state.values else {}
+        except Exception:
+            return {}
+
+    async def _asalvage_state(self, config: dict) -> dict:
+        try:
+            partial_state = await self.graph.aget_state(config)
+            return partial_state.values if partial_state.values else {}
+        except Exception:
+            return {}
+
+    def _finish_run(self, result: dict, hit_recursion_limit: bool) -> dict:
         normalized_result = normalize_agent_result(result)
         normalized_result["hit_recursion_limit"] = hit_recursion_limit
         self.last_tool_results = normalized_result.get("tool_results", [])
@@ -255,6 +727,170 @@ class AgentSession:
         normalized_result["uploaded_file_signature"] = self.uploaded_file_signature
         return normalized_result
 
+    def run(
+        self,
+        query: str,
+        thread_id: str | None = None,
+        recursion_limit: int = 100,
+        langfuse_handler=None,
+    ):
+        config = self._prepare_run(query, thread_id, recursion_limit, langfuse_handler)
+        self._reset_tool_results(config)
+
+        hit_recursion_limit = False
+        try:
+            result = self.graph.invoke(
+                self._build_input(query),
+                config=config,
+            )
+        except Exception as e:
+            if not self._is_recursion_error(e):
+                raise
+            hit_recursion_limit = True
+            result = self._salvage_state(config)
+
+        return self._finish_run(result, hit_recursion_limit)
+
+    def stream(
+        self,
+        query: str,
+        thread_id: str | None = None,
+        recursion_limit: int = 100,
+        langfuse_handler=None,
+    ) -> Iterator[tuple[str, dict]]:
+        """
+        Run a query and yield (event, data) pairs as the graph progresses.
+
+        Events: node_start, token, tool_call, tool_result, figure, node_end and
+        finally `final`, whose data is the same normalized result run() returns.
+        """
+        config = self._prepare_run(query, thread_id, recursion_limit, langfuse_handler)
+        self._reset_tool_results(config)
+
+        hit_recursion_limit = False
+        try:
+            for mode, payload in self.graph.stream(
+                self._build_input(query),
+                config=config,
+                stream_mode=["tasks", "messages"],
+            ):
+                yield from _graph_stream_events(mode, payload)
+        except Exception as e:
+            if not self._is_recursion_error(e):
+                raise
+            hit_recursion_limit = True
+
+        # The checkpointer holds the final state of the run (or what was
+        # reached before the recursion limit).
+        result = self._salvage_state(config)
+        yield "final", self._finish_run(result, hit_recursion_limit)
+
+    async def arun(
+        self,
+        query: str,
+        thread_id: str | None = None,
+        recursion_limit: int = 100,
+        langfuse_handler=None,
+    ):
+        """Async run(): awaits the LLM and offloads only code execution to threads."""
+        config = self._prepare_run(query, thread_id, recursion_limit, langfuse_handler)
+        await self._areset_tool_results(config)
+
+        hit_recursion_limit = False
+        try:
+            result = await self.graph.ainvoke(
+                self._build_input(query),
+                config=config,
+            )
+        except Exception as e:
+            if not self._is_recursion_error(e):
+                raise
+            hit_recursion_limit = True
+            result = await self._asalvage_state(config)
+
+        return self._finish_run(result, hit_recursion_limit)
+
+    async def astream(
+        self,
+        query: str,
+        thread_id: str | None = None,
+        recursion_limit: int = 100,
+        langfuse_handler=None,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """Async stream(): yields the same (event, data) pairs."""
+        config = self._prepare_run(query, thread_id, recursion_limit, langfuse_handler)
+        await self._areset_tool_results(config)
+
+        hit_recursion_limit = False
+        try:
+            async for mode, payload in self.graph.astream(
+                self._build_input(query),
+                config=config,
+                stream_mode=["tasks", "messages"],
+            ):
+                for event in _graph_stream_events(mode, payload):
+                    yield event
+        except Exception as e:
+            if not self._is_recursion_error(e):
+                raise
+            hit_recursion_limit = True
+
+        result = await self._asalvage_state(config)
+        yield "final", self._finish_run(result, hit_recursion_limit)
+
+
+def _graph_stream_events(mode: str, payload) -> Iterator[tuple[str, dict]]:
+    """Translate LangGraph stream chunks into client-facing events."""
+    if mode == "messages":
+        chunk, metadata = payload
+        if metadata.get("langgraph_node") != "agent":
+            return
+        text = _normalize_message_content(getattr(chunk, "content", ""))
+        if text:
+            yield "token", {"text": text}
+        return
+
+    node = payload.get("name")
+    if "result" not in payload and "error" not in payload:
+        yield "node_start", {"node": node}
+        return
+
+    update = payload.get("result") or {}
+    if node == "agent":
+        for message in update.get("messages", []):
+            for tc in getattr(message, "tool_calls", None) or []:
+                code, thoughts = extract_code_and_thoughts(message, tc)
+                yield "tool_call", {
+                    "id": tc.get("id"),
+                    "name": tc.get("name"),
+                    "code": code,
+                    "thoughts": thoughts,
+                }
+    elif node == "tools":
+        for item in update.get("tool_results", []):
+            if item.get("type") != "tool_result":
+                continue
+            yield "tool_result", {
+                "tool": item.get("tool"),
+                "code": item.get("code"),
+                "stdout": item.get("stdout"),
+                "error": item.get("error"),
+                "error_type": item.get("error_type"),
+                "memoized": item.get("memoized", False),
+                "duration_ms": item.get("duration_ms"),
+            }
+            for figure_payload in item.get("figures", []):
+                yield "figure", {
+                    "id": get_figure_identifier(figure_payload),
+                    "title": figure_payload.get("title"),
+                    "bytes": figure_payload.get("bytes"),
+                }
+
+    yield "node_end", {
+        "node": node,
+        "error": str(payload["error"]) if payload.get("error") else None,
+    }
+
 
 def normalize_agent_result(result: dict) -> dict:
     # tool_results only contains the current turn (tools_node resets to [] each turn).
@@ -0,0 +1,638 @@
+"""Bounded session stores used by the API layer."""
+
+import base64
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+
+import pandas as pd
+from cryptography.fernet import Fernet, InvalidToken
+from langgraph.checkpoint.memory import InMemorySaver
+
+from .checkpoint import get_default_checkpointer
+from .config import (
+    CHECKPOINTER,
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MAX_BYTES,
+    SESSION_MAX_COUNT,
+    SESSION_SECRET,
+    SESSION_STORE,
+    SESSION_STORE_DIR,
+)
+from .service import EXCEL_ENGINES, AgentSession, _load_dataset
+
+
+@dataclass
+class _Entry:
+    session: AgentSession
+    last_access: float = field(default_factory=time.monotonic)
+    bytes: int = 0
+
+
+class InMemorySessionStore:
+    """
+    Process-local session store with idle TTL, count and byte limits.
+
+    Sessions are kept in LRU order; when a limit is exceeded the least
+    recently used sessions are evicted first. The most recently used session
+    is never evicted for size, so a single large upload still works.
+    A limit of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_COUNT,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.evictions = {"ttl": 0, "count": 0, "bytes": 0}
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.bytes for entry in self._entries.values())
+
+    def get(self, session_id: str) -> AgentSession | None:
+        with self._lock:
+            self.evict_expired()
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return entry.session
+
+    def put(self, session_id: str, session: AgentSession):
+        with self._lock:
+            self._entries[session_id] = _Entry(
+                session=session, bytes=session.memory_usage()
+            )
+            self._entries.move_to_end(session_id)
+            self._enforce_limits()
+
+    def save(self, session_id: str):
+        """Re-account a session after it changed (upload, query, clear)."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return
+            entry.bytes = entry.session.memory_usage()
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(session_id)
+            self._enforce_limits()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return False
+            entry.session.close()
+            return True
+
+    def summaries(self) -> list[dict]:
+        """One line per session for listings, least recently used first."""
+        with self._lock:
+            self.evict_expired()
+            return [
+                {
+                    "session_id": sid,
+                    "model": entry.session.model,
+                    "has_data": entry.session.df is not None,
+                    "message_count": len(entry.session.messages),
+                }
+                for sid, entry in self._entries.items()
+            ]
+
+    def clear(self):
+        """Forget every session (shutdown); durable checkpoints are kept."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.session.release_dataset()
+            self._entries.clear()
+
+    def evict_expired(self) -> int:
+        if not self.idle_ttl_seconds:
+            return 0
+
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        with self._lock:
+            expired = [
+                sid
+                for sid, entry in self._entries.items()
+                if entry.last_access < deadline
+            ]
+            for sid in expired:
+                self._entries.pop(sid).session.close()
+            self.evictions["ttl"] += len(expired)
+            return len(expired)
+
+    def _enforce_limits(self):
+        self.evict_expired()
+
+        while self.max_sessions and len(self._entries) > self.max_sessions:
+            _, entry = self._entries.popitem(last=False)
+            entry.session.close()
+            self.evictions["count"] += 1
+
+        while (
+            self.max_bytes
+            and len(self._entries) > 1
+            and self.total_bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            entry.session.close()
+            self.evictions["bytes"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "bytes": self.total_bytes,
+                "limits": {
+                    "idle_ttl_seconds": self.idle_ttl_seconds,
+                    "max_sessions": self.max_sessions,
+                    "max_bytes": self.max_bytes,
+                },
+                "evictions": dict(self.evictions),
+            }
+
+
+def _dump_memory_saver(saver: InMemorySaver) -> bytes:
+    # The saver's values are already serde-encoded; only the defaultdict
+    # containers (with lambda factories) need flattening for pickle.
+    return pickle.dumps(
+        {
+            "storage": {
+                thread_id: {ns: dict(checkpoints) for ns, checkpoints in spaces.items()}
+                for thread_id, spaces in saver.storage.items()
+            },
+            "writes": {key: dict(value) for key, value in saver.writes.items()},
+            "blobs": dict(saver.blobs),
+        },
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def _api_key_cipher(secret: str | None) -> Fernet | None:
+    if not secret:
+        return None
+    key = hashlib.sha256(secret.encode("utf-8")).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _load_memory_saver(payload: bytes) -> InMemorySaver:
+    state = pickle.loads(payload)
+    saver = InMemorySaver()
+    for thread_id, spaces in state["storage"].items():
+        for ns, checkpoints in spaces.items():
+            saver.storage[thread_id][ns].update(checkpoints)
+    for key, value in state["writes"].items():
+        saver.writes[key].update(value)
+    saver.blobs.update(state["blobs"])
+    return saver
+
+
+class SQLiteSessionStore:
+    """
+    Session store shared by every worker process through one SQLite file.
+
+    Each row holds the session snapshot (model, messages, figures, tool
+    logs), its in-memory LangGraph checkpoint (CHECKPOINTER=sqlite keeps
+    checkpoints in their own shared database instead) and a version counter.
+    The API key is stored only encrypted with SESSION_SECRET; without a
+    secret it stays in the worker that received it. Uploaded datasets are
+    written once per SHA-256 as Parquet (pickle when Parquet can't hold the
+    frame) next to the database. Workers keep rehydrated AgentSession objects
+    in a local cache and rebuild one only when its row version moved on, so a
+    request can land on any worker (uvicorn --workers N, or several
+    containers on one volume); cached sessions whose rows another worker
+    removed are dropped on the next store operation.
+
+    The persistent python_repl namespace is process-local warm state and is
+    not persisted; it starts empty on a worker that rehydrates the session.
+    """
+
+    def __init__(
+        self,
+        directory: str = SESSION_STORE_DIR,
+        idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_COUNT,
+        max_bytes: int = SESSION_MAX_BYTES,
+        secret: str | None = SESSION_SECRET,
+    ):
+        self.directory = directory
+        self._cipher = _api_key_cipher(secret)
+        self.dataset_dir = os.path.join(directory, "datasets")
+        os.makedirs(self.dataset_dir, exist_ok=True)
+
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._cache: dict[str, tuple[int, AgentSession]] = {}
+        self._lock = threading.RLock()
+
+        self._db = sqlite3.connect(
+            os.path.join(directory, "sessions.db"),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                snapshot TEXT NOT NULL,
+                checkpoint BLOB,
+                dataset TEXT,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS evictions (
+                reason TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            );
+            """)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            return row is not None
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM sessions"
+            ).fetchone()[0]
+
+    # -- serialization -----------------------------------------------------
+    # Workbooks are stored as uploaded, so every sheet can be read again.
+    _DATASET_EXTENSIONS = (".parquet", ".pkl", *EXCEL_ENGINES)
+
+    def _dataset_path(self, sha256: str, extension: str = ".parquet") -> str:
+        return os.path.join(self.dataset_dir, f"{sha256}{extension}")
+
+    def _stored_dataset_path(self, sha256: str) -> str | None:
+        for extension in self._DATASET_EXTENSIONS:
+            path = self._dataset_path(sha256, extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _store_dataset(self, session: AgentSession) -> str | None:
+        signature = session.uploaded_file_signature
+        if session.df is None or not signature:
+            return None
+        if session.dataset is not None:
+            # Out-of-core: `df` is only a sample. The session is rebuilt from
+            # its Parquet directory (see AgentSession.from_snapshot) or not
+            # at all, never from the sample as if it were the whole dataset.
+            return None
+
+        sha256 = signature["sha256"]
+        if self._stored_dataset_path(sha256) is None:
+            if session.sheets is not None:
+                extension = os.path.splitext(signature["name"])[1].lower()
+                path = self._dataset_path(sha256, extension)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                session.sheets.save(tmp_path)
+                os.replace(tmp_path, path)
+                return sha256
+
+            path = self._dataset_path(sha256)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                session.df.to_parquet(tmp_path)
+            except (TypeError, ValueError, ImportError):
+                # Mixed-type object columns: fall back to pickle.
+                path = self._dataset_path(sha256, ".pkl")
+                session.df.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+        return sha256
+
+    def _load_dataset(self, sha256: str) -> tuple[pd.DataFrame, dict]:
+        """The stored frame and its load details, as the dataset cache expects."""
+        path = self._stored_dataset_path(sha256)
+        if path is None:
+            raise FileNotFoundError(f"Stored dataset {sha256} is missing")
+        if path.endswith(".pkl"):
+            return pd.read_pickle(path), {}
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path), {}
+        # A workbook: parse it as an upload, with its lazy `sheets`.
+        return _load_dataset(path, path)
+
+    def _write(self, session_id: str, session: AgentSession, insert: bool) -> int:
+        snapshot = session.snapshot()
+        if session.api_key and self._cipher is not None:
+            snapshot["api_key_encrypted"] = self._cipher.encrypt(
+                session.api_key.encode("utf-8")
+            ).decode("ascii")
+        snapshot = json.dumps(snapshot, default=str)
+        checkpoint = None
+        if isinstance(session.memory, InMemorySaver):
+            checkpoint = _dump_memory_saver(session.memory)
+        # Written outside the transaction (slow); re-checked inside it.
+        dataset = self._store_dataset(session)
+        values = (snapshot, checkpoint, dataset, session.memory_usage(), time.time())
+
+        # The write lock orders this against _collect_datasets in every
+        # worker: the file is either referenced before a collection runs, or
+        # was collected first and is written again here.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if dataset is not None:
+                self._store_dataset(session)
+            if insert:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (snapshot, checkpoint, "
+                    "dataset, bytes, last_access, version, session_id) "
+                    "VALUES (?, ?, ?, ?, ?, 1, ?)",
+                    (*values, session_id),
+                )
+                version = 1
+            else:
+                row = self._db.execute(
+                    "UPDATE sessions SET snapshot = ?, checkpoint = ?, dataset = ?, "
+                    "bytes = ?, last_access = ?, version = version + 1 "
+                    "WHERE session_id = ? RETURNING version",
+                    (*values, session_id),
+                ).fetchone()
+                version = row[0] if row else 0
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return version
+
+    def _decrypt_api_key(self, snapshot: dict) -> str | None:
+        token = snapshot.pop("api_key_encrypted", None)
+        if not token or self._cipher is None:
+            return None
+        try:
+            return self._cipher.decrypt(token.encode("ascii")).decode("utf-8")
+        except InvalidToken:
+            return None  # secret rotated; the key has to be set again
+
+    def _rehydrate(self, session_id: str) -> AgentSession | None:
+        row = self._db.execute(
+            "SELECT snapshot, checkpoint, dataset, version FROM sessions "
+            "WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        snapshot, checkpoint, dataset, version = row
+        snapshot = json.loads(snapshot)
+        # Rows written before keys were encrypted may still hold "api_key".
+        snapshot["api_key"] = self._decrypt_api_key(snapshot) or snapshot.get("api_key")
+        session = AgentSession.from_snapshot(
+            snapshot,
+            dataset_loader=(lambda: self._load_dataset(dataset)) if dataset else None,
+            memory=_load_memory_saver(checkpoint) if checkpoint else None,
+        )
+        self._uncache(session_id)
+        self._cache[session_id] = (version, session)
+        return session
+
+    def _uncache(self, session_id: str):
+        cached = self._cache.pop(session_id, None)
+        if cached is not None:
+            cached[1].release_dataset()
+
+    # -- store interface ---------------------------------------------------
+    def get(self, session_id: str) -> AgentSession | None:
+        with self._lock:
+            self.evict_expired()
+            row = self._db.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                self._uncache(session_id)
+                return None
+
+            self._db.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                (time.time(), session_id),
+            )
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[0] == row[0]:
+                return cached[1]
+            return self._rehydrate(session_id)
+
+    def put(self, session_id: str, session: AgentSession):
+        with self._lock:
+            version = self._write(session_id, session, insert=True)
+            self._cache[session_id] = (version, session)
+            self._enforce_limits()
+
+    def save(self, session_id: str):
+        """Persist a session after it changed (upload, query, clear)."""
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is None:
+                return
+            version = self._write(session_id, cached[1], insert=False)
+            if version:
+                self._cache[session_id] = (version, cached[1])
+            self._enforce_limits()
+
+    def _remove(self, session_id: str) -> bool:
+        self._uncache(session_id)
+        row = self._db.execute(
+            "DELETE FROM sessions WHERE session_id = ? "
+            "RETURNING json_extract(snapshot, '$.thread_id')",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return False
+        if CHECKPOINTER == "sqlite" and row[0]:
+            # In-memory checkpoints live in the row; durable ones are shared.
+            get_default_checkpointer().delete_thread(row[0])
+        return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            deleted = self._remove(session_id)
+            self._collect_datasets()
+            return deleted
+
+    def summaries(self) -> list[dict]:
+        """One line per session, read from the stored snapshots (no rehydration)."""
+        with self._lock:
+            self.evict_expired()
+            return [
+                {
+                    "session_id": sid,
+                    "model": model,
+                    "has_data": bool(has_data),
+                    "message_count": message_count or 0,
+                }
+                for sid, model, has_data, message_count in self._db.execute(
+                    "SELECT session_id, json_extract(snapshot, '$.model'), "
+                    "json_extract(snapshot, '$.uploaded_file_signature') IS NOT NULL, "
+                    "json_array_length(snapshot, '$.messages') "
+                    "FROM sessions ORDER BY last_access"
+                )
+            ]
+
+    def clear(self):
+        """Drop this worker's cached sessions; persisted sessions stay shared."""
+        with self._lock:
+            for session_id in list(self._cache):
+                self._uncache(session_id)
+
+    def _prune_cache(self):
+        # Drop cached sessions whose rows another worker evicted or deleted,
+        # so their frames aren't pinned here outside the byte budget.
+        if not self._cache:
+            return
+        cached = list(self._cache)
+        placeholders = ", ".join("?" for _ in cached)
+        alive = {
+            row[0]
+            for row in self._db.execute(
+                f"SELECT session_id FROM sessions WHERE session_id IN ({placeholders})",
+                cached,
+            )
+        }
+        for session_id in cached:
+            if session_id not in alive:
+                self._uncache(session_id)
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            self._prune_cache()
+            if not self.idle_ttl_seconds:
+                return 0
+
+            deadline = time.time() - self.idle_ttl_seconds
+            expired = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT session_id FROM sessions WHERE last_access < ?",
+                    (deadline,),
+                )
+            ]
+            self._evict(expired, "ttl")
+            return len(expired)
+
+    def _evict(self, session_ids: list[str], reason: str):
+        if not session_ids:
+            return
+        for sid in session_ids:
+            self._remove(sid)
+        self._db.execute(
+            "INSERT INTO evictions (reason, count) VALUES (?, ?) "
+            "ON CONFLICT(reason) DO UPDATE SET count = count + excluded.count",
+            (reason, len(session_ids)),
+        )
+        self._collect_datasets()
+
+    def _enforce_limits(self):
+        self.evict_expired()
+
+        rows = self._db.execute(
+            "SELECT session_id, bytes FROM sessions ORDER BY last_access DESC"
+        ).fetchall()
+
+        over_count = []
+        if self.max_sessions and len(rows) > self.max_sessions:
+            over_count = [sid for sid, _ in rows[self.max_sessions :]]
+            rows = rows[: self.max_sessions]
+        self._evict(over_count, "count")
+
+        # Keep the most recently used session even if it alone is too large.
+        over_bytes = []
+        total = sum(size for _, size in rows)
+        while self.max_bytes and len(rows) > 1 and total > self.max_bytes:
+            sid, size = rows.pop()
+            over_bytes.append(sid)
+            total -= size
+        self._evict(over_bytes, "bytes")
+
+    def _collect_datasets(self):
+        # Under the write lock, so no worker can be between writing a file
+        # and referencing it in its row (see _write).
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            referenced = {
+                row[0]
+                for row in self._db.execute(
+                    "SELECT DISTINCT dataset FROM sessions WHERE dataset IS NOT NULL"
+                )
+            }
+            for filename in os.listdir(self.dataset_dir):
+                sha256, extension = os.path.splitext(filename)
+                if extension in self._DATASET_EXTENSIONS and sha256 not in referenced:
+                    try:
+                        os.remove(os.path.join(self.dataset_dir, filename))
+                    except OSError:
+                        pass
+        finally:
+            self._db.execute("COMMIT")
+
+    def stats(self) -> dict:
+        with self._lock:
+            evictions = defaultdict(int, {"ttl": 0, "count": 0, "bytes": 0})
+            for reason, count in self._db.execute(
+                "SELECT reason, count FROM evictions"
+            ):
+                evictions[reason] = count
+            return {
+                "backend": "sqlite",
+                "path": self.directory,
+                "sessions": len(self),
+                "cached_sessions": len(self._cache),
+                "bytes": self.total_bytes,
+                "limits": {
+                    "idle_ttl_seconds": self.idle_ttl_seconds,
+                    "max_sessions": self.max_sessions,
+                    "max_bytes": self.max_bytes,
+                },
+                "evictions": dict(evictions),
+            }
+
+
+SESSION_STORE_BACKENDS = {
+    "memory": InMemorySessionStore,
+    "sqlite": SQLiteSessionStore,
+}
+
+
+def build_session_store(backend: str = SESSION_STORE):
+    try:
+        return SESSION_STORE_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown session store backend '{backend}'. Choose one of: "
+            + ", ".join(sorted(SESSION_STORE_BACKENDS))
+        ) from None
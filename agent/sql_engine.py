@@ -0,0 +1,157 @@
+"""DuckDB-backed execution for the sql_query tool."""
+
+import threading
+from typing import Optional
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from .config import SQL_QUERY_MAX_ROWS, SQL_RESULT_MAX_ROWS
+from .limits import NO_LIMITS, ExecutionLimits, ExecutionTimeout, MemoryLimitExceeded
+from .namespace import ReplNamespace
+
+# Name python_repl sees the last full query result under (persistent namespace).
+SQL_RESULT_NAME = "sql_result"
+
+
+def _connect(limits: ExecutionLimits) -> duckdb.DuckDBPyConnection:
+    # No replacement scans: queries only see the tables registered below,
+    # never arbitrary DataFrames lying around in the calling Python scope.
+    connection = duckdb.connect(config={"python_enable_replacements": False})
+    if limits.memory_bytes:
+        connection.execute(f"SET memory_limit = '{limits.memory_bytes // 1024**2}MB'")
+    return connection
+
+
+def _register_tables(
+    connection: duckdb.DuckDBPyConnection, query: str, df: pd.DataFrame, extra_globals
+):
+    """Expose the session data as tables; DuckDB scans the frames in place."""
+    connection.register("df", df)
+
+    dataset = extra_globals.get("dataset")
+    if dataset is not None:
+        connection.register("data", dataset.arrow_dataset)
+
+    sheets = extra_globals.get("sheets")
+    if sheets:
+        # Only parse the sheets the query can possibly mention.
+        lowered = query.lower()
+        for name in sheets:
+            if name not in ("df", "data") and name.lower() in lowered:
+                connection.register(name, sheets[name])
+
+    # Nothing the model writes may touch the filesystem or re-enable it.
+    connection.execute("SET enable_external_access = false")
+    connection.execute("SET lock_configuration = true")
+
+
+def _failed_result(error: str, error_type: str) -> dict:
+    return {
+        "stdout": "",
+        "result": None,
+        "figures": [],
+        "error": error,
+        "error_type": error_type,
+    }
+
+
+def _fetch(result: duckdb.DuckDBPyConnection, limit: int) -> tuple[pd.DataFrame, bool]:
+    """
+    At most `limit` rows of a query result (all with 0), streamed in batches.
+
+    Returns the rows and whether the result had more.
+    """
+    if not limit:
+        return result.df(), False
+    reader = result.fetch_record_batch(min(limit + 1, 100_000))
+    batches = []
+    rows = 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows > limit:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema)
+    return table.slice(0, limit).to_pandas(), rows > limit
+
+
+def _format_frame(frame: pd.DataFrame, max_rows: int, truncated: bool) -> str:
+    text = frame.head(max_rows).to_string(index=False)
+    if truncated:
+        text += (
+            f"\n... showing {min(max_rows, len(frame)):,} rows; the query returned more"
+        )
+    elif len(frame) > max_rows:
+        text += f"\n... showing {max_rows:,} of {len(frame):,} rows"
+    return text
+
+
+def run_sql_query(
+    query: str,
+    df: pd.DataFrame,
+    extra_globals: Optional[dict] = None,
+    namespace: Optional[ReplNamespace] = None,
+    limits: Optional[ExecutionLimits] = None,
+    max_rows: int = SQL_QUERY_MAX_ROWS,
+    result_max_rows: int = SQL_RESULT_MAX_ROWS,
+) -> dict:
+    """
+    Run a read-only DuckDB query over the session data.
+
+    Returns the same shape as python_repl. `df` is queryable as the table
+    `df`, out-of-core datasets as `data` and workbook sheets under their
+    names. DuckDB reads the frames without copying them and runs the query
+    vectorized over all cores, releasing the GIL while it does.
+
+    Only the rows that are used are fetched: `max_rows` for the text shown
+    to the model, or with a persistent `namespace` up to `result_max_rows`,
+    which are also bound to `sql_result` so a following python_repl call can
+    plot or model them.
+    """
+    limits = limits or NO_LIMITS
+    query = query.strip().rstrip(";")
+    if not query:
+        return _failed_result("Empty query", "sql_error")
+
+    connection = _connect(limits)
+    timer = None
+    if limits.wall_seconds:
+        timer = threading.Timer(limits.wall_seconds, connection.interrupt)
+        timer.daemon = True
+        timer.start()
+
+    try:
+        _register_tables(connection, query, df, extra_globals or {})
+        frame, truncated = _fetch(
+            connection.execute(query),
+            result_max_rows if namespace is not None else max_rows,
+        )
+    except duckdb.InterruptException:
+        error_type = ExecutionTimeout.error_type
+        return _failed_result(limits.describe(error_type), error_type)
+    except duckdb.OutOfMemoryException:
+        error_type = MemoryLimitExceeded.error_type
+        return _failed_result(limits.describe(error_type), error_type)
+    except duckdb.Error as e:
+        return _failed_result(str(e), "sql_error")
+    finally:
+        if timer is not None:
+            timer.cancel()
+        connection.close()
+
+    tool_result = {
+        "stdout": _format_frame(frame, max_rows, truncated),
+        "result": None,
+        "figures": [],
+        "error": None,
+        "error_type": None,
+    }
+    if namespace is not None:
+        if truncated:
+            tool_result[
+                "stdout"
+            ] += f"\n`{SQL_RESULT_NAME}` holds the first {len(frame):,} rows"
+        tool_result["variables"] = namespace.absorb({SQL_RESULT_NAME: frame})
+    return tool_result
@@ -0,0 +1,213 @@
+"""Lazy, per-sheet access to uploaded Excel workbooks."""
+
+import ast
+import os
+import shutil
+import threading
+import uuid
+import weakref
+from collections.abc import Mapping
+from io import BytesIO
+from typing import Callable, Iterator, Optional
+
+import pandas as pd
+
+from .helpers import _isolated_frame
+
+
+def referenced_sheets(code: str, name: str = "sheets") -> set[str] | None:
+    """
+    Sheet names a code string reads as `sheets["..."]` literals.
+
+    Returns None when the code uses `sheets` any other way (iteration,
+    `.items()`, a computed key), meaning every sheet may be needed.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+
+    literal_uses = set()
+    sheet_names = set()
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.value, ast.Name)
+            and node.value.id == name
+            and isinstance(node.slice, ast.Constant)
+            and isinstance(node.slice.value, str)
+        ):
+            literal_uses.add(id(node.value))
+            sheet_names.add(node.slice.value)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == name:
+            if id(node) not in literal_uses:
+                return None
+    return sheet_names
+
+
+def _link_or_copy(source: str, destination: str):
+    try:
+        os.link(source, destination)  # no copy on filesystems with hard links
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _own_copy(path: str) -> str:
+    """A path to `path`'s contents that stays valid after `path` is removed."""
+    owned = f"{path}.{uuid.uuid4().hex}.workbook"
+    _link_or_copy(path, owned)
+    return owned
+
+
+def _close_workbook(excel: pd.ExcelFile, path: Optional[str]):
+    excel.close()
+    if path is not None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class LazySheets(Mapping):
+    """
+    Read-only mapping of sheet name -> DataFrame for one workbook.
+
+    Sheet names come from the workbook metadata when it is opened; a sheet is
+    only parsed the first time it is read and then cached, so a workbook with
+    many sheets costs one sheet's parse until the others are actually used.
+    Shared between sessions through the dataset cache, so python_repl gets
+    isolated copies via for_execution() rather than the cached frames.
+
+    A workbook given as a path (a spooled upload) is read from disk and never
+    loaded into memory whole; this object keeps its own link to the file,
+    removed when it is garbage collected.
+    """
+
+    def __init__(
+        self,
+        workbook,
+        engine: str,
+        transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ):
+        owned = None
+        if isinstance(workbook, (str, os.PathLike)):
+            owned = _own_copy(os.fspath(workbook))
+            self._workbook_data = None
+            source = owned
+        else:
+            self._workbook_data = workbook
+            source = BytesIO(workbook)
+        self._workbook_path = owned
+        try:
+            self._excel = pd.ExcelFile(source, engine=engine)
+        except BaseException:
+            if owned is not None:
+                os.remove(owned)
+            raise
+        weakref.finalize(self, _close_workbook, self._excel, owned)
+        self._transform = transform
+        self.names = [str(name) for name in self._excel.sheet_names]
+        self._frames: dict[str, pd.DataFrame] = {}
+        self._frame_bytes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, name: str) -> pd.DataFrame:
+        """Parse one sheet as-is, bypassing the cache and the transform."""
+        if name not in self.names:
+            raise KeyError(f"No sheet named {name!r}. Available sheets: {self.names}")
+        with self._lock:
+            # Workbook readers aren't thread-safe.
+            return self._excel.parse(name)
+
+    def seed(self, name: str, frame: pd.DataFrame):
+        """
+        Cache an already prepared frame for `name` (e.g. the first sheet).
+
+        Seeded frames are accounted by the caller, not by nbytes.
+        """
+        with self._lock:
+            self._frames[name] = frame
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        with self._lock:
+            frame = self._frames.get(name)
+        if frame is not None:
+            return frame
+
+        frame = self.parse(name)
+        if self._transform is not None:
+            frame = self._transform(frame)
+        size = int(frame.memory_usage(deep=True).sum())
+        with self._lock:
+            # Another thread may have parsed it meanwhile; keep the first.
+            if name not in self._frames:
+                self._frames[name] = frame
+                self._frame_bytes[name] = size
+            return self._frames[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __repr__(self) -> str:
+        return f"<sheets {self.names}, loaded: {self.loaded}>"
+
+    @property
+    def loaded(self) -> list[str]:
+        with self._lock:
+            return [name for name in self.names if name in self._frames]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held for the workbook and the sheets parsed on demand."""
+        with self._lock:
+            return len(self._workbook_data or b"") + sum(self._frame_bytes.values())
+
+    def save(self, path: str):
+        """Write the workbook file to `path`, e.g. to persist a session."""
+        if self._workbook_path is not None:
+            _link_or_copy(self._workbook_path, path)
+        else:
+            with open(path, "wb") as handle:
+                handle.write(self._workbook_data)
+
+    def for_execution(self, code: str, portable: bool = False):
+        """
+        What python_repl binds to `sheets` for one run of `code`.
+
+        In-process runs get a lazy view handing out isolated copies. Worker
+        processes can't parse on demand through this object, so `portable`
+        resolves the sheets the code names up front (all of them if it uses
+        `sheets` dynamically) into a plain dict.
+        """
+        if not portable:
+            return _SheetView(self)
+        wanted = referenced_sheets(code)
+        names = self.names if wanted is None else [n for n in self.names if n in wanted]
+        return {name: self[name] for name in names}
+
+
+class _SheetView(Mapping):
+    """Per-execution view: each sheet is isolated once, so edits stick for the run."""
+
+    def __init__(self, sheets: LazySheets):
+        self._sheets = sheets
+        self._frames: dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        if name not in self._frames:
+            self._frames[name] = _isolated_frame(self._sheets[name])
+        return self._frames[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sheets)
+
+    def __len__(self) -> int:
+        return len(self._sheets)
+
+    def __repr__(self) -> str:
+        return repr(self._sheets)
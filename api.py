@@ -6,7 +6,9 @@ Run with:
 
 from __future__ import annotations
 
-import math
+import asyncio
+import gzip
+import hashlib
 import os
 import uuid
 from contextlib import asynccontextmanager
@@ -16,12 +18,27 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+import orjson
+from fastapi import FastAPI, File, Header, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-
-from agent import DEFAULT_MODEL, AgentSession
+from starlette.concurrency import run_in_threadpool
+
+from agent import DEFAULT_MODEL, AgentSession, UploadSpool, get_figure_identifier
+from agent.checkpoint import get_default_checkpointer
+from agent.config import (
+    CHECKPOINTER,
+    REPL_PERSISTENT_NAMESPACE,
+    RESPONSE_COMPRESSION_MIN_BYTES,
+    UPLOAD_CHUNK_BYTES,
+)
+from agent.datasets import get_dataset_cache
+from agent.figure_store import get_figure_store
+from agent.helpers import _orjson_default
+from agent.memo import get_repl_memo
+from agent.executors import get_default_executor, shutdown_default_executor
+from agent.session_store import build_session_store
 
 try:
     from langfuse.langchain import CallbackHandler as LangfuseCallbackHandler
@@ -33,33 +50,105 @@ except ImportError:
     LangfuseCallbackHandler = None
     get_client = None
 
+try:
+    import brotli
+
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    brotli = None
+
 
 # ---------------------------------------------------------------------------
 # JSON helpers — DataFrames can contain NaN / inf which stdlib json rejects.
 # ---------------------------------------------------------------------------
-def _sanitize(obj: Any) -> Any:
-    """Recursively replace NaN / inf floats with None for JSON safety."""
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    if isinstance(obj, dict):
-        return {k: _sanitize(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple)):
-        return [_sanitize(v) for v in obj]
-    return obj
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+# Fast settings: responses are compressed per request, not cached.
+_GZIP_LEVEL = 1
+_BROTLI_QUALITY = 4
 
 
-def SafeJSONResponse(content: Any, **kwargs) -> JSONResponse:
-    """JSONResponse that converts NaN/inf → null so it never crashes."""
-    return JSONResponse(content=_sanitize(content), **kwargs)
+def _json_default(obj: Any) -> Any:
+    try:
+        return _orjson_default(obj)
+    except TypeError:
+        # Timestamps and anything else stdlib-unfriendly end up as text.
+        return obj.isoformat() if hasattr(obj, "isoformat") else str(obj)
+
+
+def _dumps(content: Any) -> bytes:
+    """orjson encoding; NaN / inf become null without walking the content."""
+    return orjson.dumps(content, default=_json_default, option=_ORJSON_OPTIONS)
+
+
+def _negotiate_encoding(
+    accept_encoding: str | None, available: tuple[str, ...]
+) -> str | None:
+    """Preferred content coding of `available` the client accepts, if any."""
+    qualities = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        try:
+            qualities[coding] = float(params.strip().removeprefix("q=") or 1)
+        except ValueError:
+            qualities[coding] = 1.0
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in available:  # in server preference order
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=_GZIP_LEVEL)
+
+
+class SafeJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson, compressed when the client accepts it.
+
+    NaN / inf become null and numpy / pandas values are encoded natively, so
+    the content is never walked in Python. Bodies of at least
+    RESPONSE_COMPRESSION_MIN_BYTES are sent brotli- (if installed) or
+    gzip-compressed, per the request's Accept-Encoding.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            RESPONSE_COMPRESSION_MIN_BYTES
+            and len(self.body) >= RESPONSE_COMPRESSION_MIN_BYTES
+            and "content-encoding" not in self.headers
+        ):
+            accept_encoding = dict(scope.get("headers", [])).get(b"accept-encoding")
+            encoding = _negotiate_encoding(
+                accept_encoding.decode("latin-1") if accept_encoding else None,
+                ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",),
+            )
+            if encoding:
+                self.body = await run_in_threadpool(_compress, self.body, encoding)
+                self.headers["Content-Encoding"] = encoding
+                self.headers["Content-Length"] = str(len(self.body))
+            self.headers.add_vary_header("Accept-Encoding")
+        await super().__call__(scope, receive, send)
 
 
 # ---------------------------------------------------------------------------
-# In-memory session store
-# Replace with Redis / DB-backed store for production multi-worker deploys.
+# Session store with idle TTL and count/byte limits (LRU eviction).
+# SESSION_STORE=sqlite shares sessions between uvicorn workers / containers.
 # ---------------------------------------------------------------------------
-_sessions: dict[str, AgentSession] = {}
+SESSION_SWEEP_INTERVAL_SECONDS = 60
+
+_sessions = build_session_store()
 _langfuse_client = None
 _langfuse_handler = None
 
@@ -108,8 +197,37 @@ def _parse_metadata_fields(include_metadata: str | None) -> set[str]:
     return fields
 
 
+def _figure_ref(session_id: str, figure_payload: dict) -> dict[str, Any]:
+    """What responses carry for a figure; the JSON itself is fetched lazily."""
+    figure_id = get_figure_identifier(figure_payload)
+    size = figure_payload.get("bytes")
+    if size is None:
+        size = len(figure_payload.get("figure_json", "").encode("utf-8"))
+    return {
+        "id": figure_id,
+        "title": figure_payload.get("title"),
+        "bytes": size,
+        "downsampled": figure_payload.get("downsampled", False),
+        "url": f"/sessions/{session_id}/figures/{figure_id}",
+    }
+
+
+def _with_figure_refs(session_id: str, items: list[dict]) -> list[dict]:
+    return [
+        (
+            {
+                **item,
+                "figures": [_figure_ref(session_id, f) for f in item["figures"]],
+            }
+            if item.get("figures")
+            else item
+        )
+        for item in items
+    ]
+
+
 def _build_query_metadata(
-    session: AgentSession, include_fields: set[str]
+    session_id: str, session: AgentSession, include_fields: set[str]
 ) -> dict[str, Any]:
     metadata: dict[str, Any] = {}
 
@@ -122,17 +240,26 @@ def _build_query_metadata(
             "message_count": len(session.messages),
             "figure_count": len(session.figures),
             "uploaded_file": session.uploaded_file_signature,
+            "namespace": session.namespace.stats() if session.namespace else None,
         }
     if "messages" in include_fields:
-        metadata["messages"] = session.messages
+        metadata["messages"] = _with_figure_refs(session_id, session.messages)
     if "figures" in include_fields:
-        metadata["figures"] = session.figures
+        metadata["figures"] = [_figure_ref(session_id, f) for f in session.figures]
     if "tool-results" in include_fields:
-        metadata["tool_results"] = session.last_tool_results
+        metadata["tool_results"] = _with_figure_refs(
+            session_id, session.last_tool_results
+        )
 
     return metadata
 
 
+async def _sweep_expired_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+        await asyncio.to_thread(_sessions.evict_expired)
+
+
 # ---------------------------------------------------------------------------
 # Lifespan (startup / shutdown)
 # ---------------------------------------------------------------------------
@@ -140,9 +267,14 @@ def _build_query_metadata(
 async def lifespan(app: FastAPI):
     # Startup: initialize Langfuse if available
     _init_langfuse()
+    # Start (and pre-warm) the code executor before the first query arrives
+    get_default_executor()
+    sweeper = asyncio.create_task(_sweep_expired_sessions())
     yield
     # Shutdown: clean up sessions
+    sweeper.cancel()
     _sessions.clear()
+    shutdown_default_executor()
 
 
 # ---------------------------------------------------------------------------
@@ -153,6 +285,7 @@ app = FastAPI(
     description="RESTful API for the Data Science Agent — upload data, ask questions, get AI-powered insights.",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=SafeJSONResponse,
 )
 
 app.add_middleware(
@@ -172,6 +305,17 @@ class CreateSessionRequest(BaseModel):
         default=DEFAULT_MODEL,
         description="Model name to use.",
     )
+    persistent_namespace: bool = Field(
+        default=REPL_PERSISTENT_NAMESPACE,
+        description="Keep python_repl variables alive across tool calls and turns.",
+    )
+    out_of_core: Optional[bool] = Field(
+        default=None,
+        description=(
+            "Keep uploads on disk as Parquet and query them through DuckDB. "
+            "Defaults to automatic, based on upload size."
+        ),
+    )
 
 
 class CreateSessionResponse(BaseModel):
@@ -212,9 +356,13 @@ class SessionInfoResponse(BaseModel):
 @app.post("/sessions", response_model=CreateSessionResponse, tags=["Sessions"])
 def create_session(body: CreateSessionRequest):
     """Create a new agent session."""
-    session = AgentSession(model=body.model)
+    session = AgentSession(
+        model=body.model,
+        persistent_namespace=body.persistent_namespace,
+        out_of_core=body.out_of_core,
+    )
     session_id = uuid.uuid4().hex
-    _sessions[session_id] = session
+    _sessions.put(session_id, session)
     return CreateSessionResponse(
         session_id=session_id,
         model=session.model,
@@ -224,15 +372,7 @@ def create_session(body: CreateSessionRequest):
 @app.get("/sessions", tags=["Sessions"])
 def list_sessions():
     """List all active sessions."""
-    return [
-        {
-            "session_id": sid,
-            "model": s.model,
-            "has_data": s.df is not None,
-            "message_count": len(s.messages),
-        }
-        for sid, s in _sessions.items()
-    ]
+    return _sessions.summaries()
 
 
 @app.get(
@@ -256,7 +396,7 @@ def get_session_info(session_id: str):
 def delete_session(session_id: str):
     """Delete (destroy) a session entirely."""
     _get_session(session_id)  # ensure it exists
-    del _sessions[session_id]
+    _sessions.delete(session_id)
     return {"detail": "Session deleted"}
 
 
@@ -265,6 +405,7 @@ def clear_session(session_id: str):
     """Clear chat history and memory but keep the session alive."""
     s = _get_session(session_id)
     s.clear_memory()
+    _sessions.save(session_id)
     return {"detail": "Session memory cleared"}
 
 
@@ -277,27 +418,41 @@ def set_api_key(session_id: str, body: SetApiKeyRequest):
         s.set_api_key(body.api_key)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    _sessions.save(session_id)
     return {"detail": "API key set", "model": s.model}
 
 
 # -- File upload -------------------------------------------------------------
 @app.post("/sessions/{session_id}/upload", tags=["Data"])
 async def upload_file(session_id: str, file: UploadFile = File(...)):
-    """Upload a CSV / Excel file to a session."""
-    s = _get_session(session_id)
-    file_bytes = await file.read()
+    """Upload a CSV / Excel / Parquet / Feather / Arrow file to a session."""
+    s = await asyncio.to_thread(_get_session, session_id)
 
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
 
-    try:
-        s.load_uploaded_file(file_bytes, file.filename)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Stream to a spool file (hashing on the way) and parse from disk, so the
+    # upload is never held in memory next to the parsed frame.
+    with UploadSpool(file.filename) as spool:
+        while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+            await asyncio.to_thread(spool.write, chunk)
+        spool.close()
+
+        try:
+            upload = await asyncio.to_thread(
+                s.load_uploaded_path, spool.path, spool.signature
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    await asyncio.to_thread(_sessions.save, session_id)
 
     return {
         "filename": file.filename,
         "shape": list(s.df.shape) if s.df is not None else None,
+        "sheets": upload["sheets"],
+        "dtype_compaction": upload["dtype_compaction"],
+        "profile": upload["profile"],
+        "out_of_core": upload["out_of_core"],
     }
 
 
@@ -317,17 +472,31 @@ def preview_data(session_id: str, rows: int = 5):
     )
 
 
-# -- Chat / Query ------------------------------------------------------------
-@app.post("/sessions/{session_id}/query", response_model=QueryResponse, tags=["Chat"])
-def run_query(
+@app.get("/sessions/{session_id}/data/stats", tags=["Data"])
+def data_stats(
     session_id: str,
-    body: QueryRequest,
-    x_include_metadata: str | None = Header(default=None),
+    columns: Optional[list[str]] = Query(default=None),
+    top: int = 10,
 ):
-    """Send a natural-language query to the agent."""
+    """
+    Per-column statistics of the uploaded dataset (nulls, distinct values,
+    numeric summary or most frequent values).
+
+    Served from the dataset's statistics cache, shared with python_repl's
+    `df_stats`: only columns not summarized before are scanned.
+    """
     s = _get_session(session_id)
-    include_fields = _parse_metadata_fields(x_include_metadata)
+    if s.df is None:
+        raise HTTPException(status_code=400, detail="No data uploaded yet")
+    try:
+        summary = s.df_stats.summary(columns, top=top)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    return SafeJSONResponse({"columns": summary, "cache": s.df_stats.stats()})
+
 
+# -- Chat / Query ------------------------------------------------------------
+def _ensure_ready_for_query(s: AgentSession):
     if s.df is None:
         raise HTTPException(status_code=400, detail="Upload data before querying")
     if s.graph is None:
@@ -336,25 +505,143 @@ def run_query(
             detail="API key not set — call POST /sessions/{id}/api-key first",
         )
 
-    try:
-        result = s.run(
-            query=body.query,
-            langfuse_handler=_langfuse_handler,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
+def _build_query_response(
+    result: dict, session_id: str, s: AgentSession, include_fields: set[str]
+) -> dict[str, Any]:
     response = {
         "answer": result.get("answer", ""),
     }
     if result.get("figures"):
-        response["figures"] = result["figures"]
+        response["figures"] = [_figure_ref(session_id, f) for f in result["figures"]]
 
-    metadata = _build_query_metadata(s, include_fields)
+    metadata = _build_query_metadata(session_id, s, include_fields)
     if metadata:
         response["metadata"] = metadata
 
-    return SafeJSONResponse(response)
+    return response
+
+
+def _format_sse(event: str, data: Any) -> str:
+    payload = _dumps(data).decode("utf-8")
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@app.post("/sessions/{session_id}/query", response_model=QueryResponse, tags=["Chat"])
+async def run_query(
+    session_id: str,
+    body: QueryRequest,
+    x_include_metadata: str | None = Header(default=None),
+):
+    """Send a natural-language query to the agent."""
+    s = await asyncio.to_thread(_get_session, session_id)
+    include_fields = _parse_metadata_fields(x_include_metadata)
+    _ensure_ready_for_query(s)
+
+    try:
+        result = await s.arun(
+            query=body.query,
+            langfuse_handler=_langfuse_handler,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    await asyncio.to_thread(_sessions.save, session_id)
+
+    return SafeJSONResponse(
+        _build_query_response(result, session_id, s, include_fields)
+    )
+
+
+@app.post("/sessions/{session_id}/query/stream", tags=["Chat"])
+async def stream_query(
+    session_id: str,
+    body: QueryRequest,
+    x_include_metadata: str | None = Header(default=None),
+):
+    """
+    Send a query and stream progress as Server-Sent Events.
+
+    Event types: `node_start`, `token`, `tool_call`, `tool_result`, `figure`,
+    `node_end`, then `final` (same body as POST /query) or `error`.
+    """
+    s = await asyncio.to_thread(_get_session, session_id)
+    include_fields = _parse_metadata_fields(x_include_metadata)
+    _ensure_ready_for_query(s)
+
+    async def event_stream():
+        try:
+            async for event, data in s.astream(
+                query=body.query,
+                langfuse_handler=_langfuse_handler,
+            ):
+                if event == "final":
+                    await asyncio.to_thread(_sessions.save, session_id)
+                    data = _build_query_response(data, session_id, s, include_fields)
+                yield _format_sse(event, data)
+        except Exception as e:
+            yield _format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -- Figures -----------------------------------------------------------------
+@app.get("/sessions/{session_id}/figures/{figure_id}", tags=["Figures"])
+def get_figure(
+    session_id: str,
+    figure_id: str,
+    if_none_match: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+):
+    """
+    Plotly JSON of one of the session's figures (`plotly.io.from_json` input).
+
+    Figures are immutable, so the ETag is the SHA-256 of the JSON and clients
+    can revalidate with If-None-Match. Sent gzip-compressed when the client
+    accepts it (straight from the figure store, without recompressing).
+    """
+    s = _get_session(session_id)
+    figure_payload = s.find_figure(figure_id)
+    if figure_payload is None:
+        raise HTTPException(status_code=404, detail=f"Figure '{figure_id}' not found")
+
+    figure_json = figure_payload.get("figure_json")
+    digest = (
+        figure_payload.get("sha256")
+        or hashlib.sha256(figure_json.encode("utf-8")).hexdigest()
+    )
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    ):
+        return Response(status_code=304, headers=headers)
+
+    gzip_ok = _negotiate_encoding(accept_encoding, ("gzip",)) == "gzip"
+    if figure_json is not None:
+        body = figure_json.encode("utf-8")
+        if gzip_ok:
+            body = gzip.compress(body, compresslevel=_GZIP_LEVEL)
+    else:
+        body = get_figure_store().get_compressed(digest)
+        if body is None:
+            raise HTTPException(
+                status_code=404, detail=f"Figure '{figure_id}' is no longer stored"
+            )
+        if not gzip_ok:
+            body = gzip.decompress(body)
+
+    if gzip_ok:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # ---------------------------------------------------------------------------
@@ -368,5 +655,15 @@ def health():
     return {
         "status": "ok",
         "active_sessions": len(_sessions),
+        "session_store": _sessions.stats(),
         "langfuse": langfuse_status,
+        "executor": get_default_executor().stats(),
+        "dataset_cache": get_dataset_cache().stats(),
+        "figure_store": get_figure_store().stats(),
+        "repl_memo": (memo.stats() if (memo := get_repl_memo()) is not None else None),
+        "checkpointer": (
+            get_default_checkpointer().stats()
+            if CHECKPOINTER == "sqlite"
+            else {"backend": CHECKPOINTER}
+        ),
     }
@@ -0,0 +1,156 @@
+"""Benchmark JSON encoding and compression of a figure-heavy /query response.
+
+Compares the previous rendering (a recursive NaN/inf walk, then stdlib json
+through JSONResponse) with SafeJSONResponse's single orjson pass, and shows
+the bytes on the wire uncompressed, gzip-compressed and (if the brotli
+package is installed) brotli-compressed. The payload is a session answered
+with `X-Include-Metadata: all`: figures inline (as before the figure store,
+or as served by the figure endpoint), tool results and a data preview with
+missing values. "refs" is the same response as the API sends it now, with
+figure references instead of inline JSON.
+
+Run with:
+    python -m benchmarks.api_responses --figures 10 --points 50000
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from fastapi.responses import JSONResponse
+
+from agent.helpers import figure_to_json
+from api import BROTLI_AVAILABLE, SafeJSONResponse, _compress, _figure_ref
+
+
+def legacy_sanitize(obj):
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {k: legacy_sanitize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [legacy_sanitize(v) for v in obj]
+    return obj
+
+
+def legacy_render(payload) -> bytes:
+    return JSONResponse(content=legacy_sanitize(payload)).body
+
+
+def current_render(payload) -> bytes:
+    return SafeJSONResponse(payload).body
+
+
+def with_figure_refs(payload: dict) -> dict:
+    def refs(item):
+        if not item.get("figures"):
+            return item
+        return {**item, "figures": [_figure_ref("s", f) for f in item["figures"]]}
+
+    metadata = payload["metadata"]
+    return {
+        **refs(payload),
+        "metadata": {
+            **metadata,
+            "messages": [refs(message) for message in metadata["messages"]],
+            "figures": refs(metadata)["figures"],
+            "tool_results": [refs(result) for result in metadata["tool_results"]],
+        },
+    }
+
+
+def build_payload(figures: int, points: int, preview_rows: int) -> dict:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "x": rng.normal(size=points),
+            "y": rng.normal(size=points),
+            "group": rng.choice(["a", "b", "c"], size=points),
+        }
+    )
+    df.loc[::7, "y"] = np.nan
+    figure_payloads = [
+        {
+            "id": f"figure-{index}",
+            "title": f"Figure {index}",
+            "figure_json": figure_to_json(
+                px.scatter(df, x="x", y="y", color="group"), typed_arrays=True
+            )[0],
+        }
+        for index in range(figures)
+    ]
+    messages = []
+    tool_results = []
+    for figure_payload in figure_payloads:
+        messages.append({"role": "user", "content": "Plot y against x by group"})
+        messages.append(
+            {"role": "assistant", "content": "Here it is.", "figures": [figure_payload]}
+        )
+        tool_results.append(
+            {
+                "type": "tool_result",
+                "code": "px.scatter(df, x='x', y='y', color='group')",
+                "stdout": df.describe().to_string(),
+                "figures": [figure_payload],
+            }
+        )
+    return {
+        "answer": "Here are the figures.",
+        "figures": figure_payloads[-1:],
+        "metadata": {
+            "messages": messages,
+            "figures": figure_payloads,
+            "tool_results": tool_results,
+            "preview": df.head(preview_rows).to_dict(orient="records"),
+        },
+    }
+
+
+def best_of(function, argument, repeats: int) -> tuple[float, bytes]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--figures", type=int, default=10)
+    parser.add_argument("--points", type=int, default=50_000)
+    parser.add_argument("--preview-rows", type=int, default=5_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = build_payload(args.figures, args.points, args.preview_rows)
+    encodings = ("gzip", "br") if BROTLI_AVAILABLE else ("gzip",)
+    for label, render, content in (
+        ("legacy", legacy_render, payload),
+        ("orjson", current_render, payload),
+        ("refs", current_render, with_figure_refs(payload)),
+    ):
+        latency_ms, body = best_of(render, content, args.repeats)
+        print(
+            f"{label:<6} | encode   {latency_ms:8.1f} ms | "
+            f"{len(body) / 1024**2:7.2f} MiB"
+        )
+        if label == "legacy":
+            continue
+        for encoding in encodings:
+            latency_ms, compressed = best_of(
+                lambda data: _compress(data, encoding), body, args.repeats
+            )
+            print(
+                f"  {encoding:<4} | compress {latency_ms:8.1f} ms | "
+                f"{len(compressed) / 1024**2:7.2f} MiB on the wire"
+            )
+    if not BROTLI_AVAILABLE:
+        print("brotli not installed (pip install brotli) - br not measured")
+
+
+if __name__ == "__main__":
+    main()
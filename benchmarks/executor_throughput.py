@@ -0,0 +1,73 @@
+"""Benchmark python_repl throughput under concurrent sessions per executor backend.
+
+Each simulated session runs a CPU-bound groupby on its own thread, the way
+concurrent API requests do.
+
+Run with:
+    python -m benchmarks.executor_throughput --sessions 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from agent.executors import InProcessExecutor, WorkerPoolExecutor
+
+CPU_BOUND_CODE = """
+total = 0
+for _ in range(3):
+    total += df.groupby('key')['value'].apply(lambda s: (s ** 2).sum()).sum()
+print(total)
+"""
+
+
+def run_sessions(executor, frames: list[pd.DataFrame]) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(frames)) as threads:
+        results = list(
+            threads.map(
+                lambda frame: executor.execute(CPU_BOUND_CODE, "", frame), frames
+            )
+        )
+    elapsed = time.perf_counter() - start
+    errors = [result["error"] for result in results if result["error"]]
+    if errors:
+        raise RuntimeError(errors[0])
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [
+        pd.DataFrame(
+            {
+                "key": rng.integers(0, 20_000, size=args.rows),
+                "value": rng.normal(size=args.rows),
+            }
+        )
+        for _ in range(args.sessions)
+    ]
+
+    backends = [InProcessExecutor(), WorkerPoolExecutor(max_workers=args.sessions)]
+    for executor in backends:
+        for frame in frames:
+            executor.execute("pass", "", frame)  # publish/attach every frame first
+        elapsed = run_sessions(executor, frames)
+        print(
+            f"{executor.name:>12} | {args.sessions} sessions | {elapsed:6.2f} s"
+            f" | {args.sessions / elapsed:5.2f} calls/s"
+        )
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
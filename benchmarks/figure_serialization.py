@@ -0,0 +1,97 @@
+"""Benchmark per-figure serialization time of python_repl's Plotly figures.
+
+Compares the previous three-pass path (fig.to_dict(), a recursive
+_make_json_safe walk, json.dumps) with the single orjson pass used by
+serialize_plotly_figure, writing numeric arrays as JSON lists and as base64
+typed arrays, on scatter plots built with plotly express (numpy arrays) and
+graph_objects from Python lists. Downsampling is left off so every variant
+encodes all points; "parse" is the client-side pio.from_json time.
+
+Run with:
+    python -m benchmarks.figure_serialization --points 100000 1000000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import plotly.io as pio
+
+from agent.helpers import _make_json_safe, figure_to_json
+
+
+def legacy_serialize(fig) -> str:
+    return json.dumps(_make_json_safe(fig.to_dict()))
+
+
+def orjson_serialize(fig) -> str:
+    return figure_to_json(fig)[0]
+
+
+def typed_array_serialize(fig) -> str:
+    return figure_to_json(fig, typed_arrays=True)[0]
+
+
+def build_figures(points: int) -> dict:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "x": rng.normal(size=points),
+            "y": rng.normal(size=points),
+            "when": pd.date_range("2024-01-01", periods=points, freq="s"),
+            "group": rng.choice(["a", "b", "c"], size=points),
+        }
+    )
+    df.loc[::1000, "y"] = np.nan
+    return {
+        "px.scatter": px.scatter(df, x="x", y="y", color="group"),
+        "px.line (dates)": px.line(df, x="when", y="y"),
+        "go.Scattergl (lists)": go.Figure(
+            go.Scattergl(x=df["x"].tolist(), y=df["y"].tolist(), mode="markers")
+        ),
+    }
+
+
+def measure(serialize, fig, repeats: int) -> tuple[float, float, int]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        payload = serialize(fig)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    try:
+        pio.from_json(payload)
+        parse_ms = (time.perf_counter() - start) * 1000
+    except ValueError:
+        parse_ms = float("nan")  # json.dumps writes NaN, which isn't JSON
+    return min(timings) * 1000, parse_ms, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    for points in args.points:
+        for name, fig in build_figures(points).items():
+            for label, serialize in (
+                ("legacy", legacy_serialize),
+                ("orjson", orjson_serialize),
+                ("typed", typed_array_serialize),
+            ):
+                latency_ms, parse_ms, size = measure(serialize, fig, args.repeats)
+                print(
+                    f"{points:>9,} | {name:<20} | {label:<6} | "
+                    f"{latency_ms:9.1f} ms | parse {parse_ms:9.1f} ms | "
+                    f"{size / 1024**2:7.1f} MiB"
+                )
+
+
+if __name__ == "__main__":
+    main()
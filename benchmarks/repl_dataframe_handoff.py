@@ -0,0 +1,75 @@
+"""Benchmark the DataFrame hand-off cost of python_repl.
+
+Compares the legacy deep copy with the copy-on-write view on a large frame.
+
+Run with:
+    python -m benchmarks.repl_dataframe_handoff --rows 5000000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from agent.helpers import python_repl
+
+INSPECTION_CODE = "print(df.shape)"
+MUTATION_CODE = "df['a'] = df['a'] * 2\nprint(df['a'].sum())"
+
+
+def build_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "a": rng.normal(size=rows),
+            "b": rng.integers(0, 1_000, size=rows),
+            "c": rng.normal(size=rows),
+            "d": rng.normal(size=rows),
+        }
+    )
+
+
+def measure(code: str, df: pd.DataFrame, repeats: int) -> tuple[float, float]:
+    timings = []
+    peak_bytes = 0
+    for _ in range(repeats):
+        tracemalloc.start()
+        start = time.perf_counter()
+        python_repl(code=code, thoughts="", df=df)
+        timings.append(time.perf_counter() - start)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(timings) * 1000, peak_bytes / 1024**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    df = build_frame(args.rows)
+    original = df.copy()
+    frame_mb = df.memory_usage(deep=True).sum() / 1024**2
+    print(f"frame: {args.rows:,} rows, {frame_mb:.1f} MiB")
+
+    # Warm the lazy sklearn/statsmodels imports so they don't skew the first run.
+    python_repl(code="pass", thoughts="", df=df.head())
+
+    for copy_on_write in (False, True):
+        pd.set_option("mode.copy_on_write", copy_on_write)
+        label = "copy-on-write" if copy_on_write else "deep copy"
+        for name, code in (("inspect", INSPECTION_CODE), ("mutate", MUTATION_CODE)):
+            latency_ms, peak_mb = measure(code, df, args.repeats)
+            print(
+                f"{label:>14} | {name:<7} | {latency_ms:8.2f} ms | peak {peak_mb:8.1f} MiB"
+            )
+
+    pd.testing.assert_frame_equal(df, original)
+    print("session frame unchanged: ok")
+
+
+if __name__ == "__main__":
+    main()
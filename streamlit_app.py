@@ -1,7 +1,12 @@
 import streamlit as st
 import time
 import plotly.io as pio
-from agent import AgentSession, SUPPORTED_UPLOAD_TYPES, get_figure_identifier
+from agent import (
+    AgentSession,
+    SUPPORTED_UPLOAD_TYPES,
+    get_figure_identifier,
+    load_figure_json,
+)
 import streamlit.components.v1 as components
 
 from dotenv import load_dotenv
@@ -47,11 +52,7 @@ def summarize_figures(figure_payloads):
 
 def render_figures(figure_payloads, key_prefix):
     for index, figure_payload in enumerate(figure_payloads, start=1):
-        figure_json = (
-            figure_payload.get("figure_json")
-            if isinstance(figure_payload, dict)
-            else None
-        )
+        figure_json = load_figure_json(figure_payload)
         figure_id = get_figure_identifier(figure_payload) or f"figure_{index}"
 
         if not figure_json:
@@ -65,6 +66,12 @@ def render_figures(figure_payloads, key_prefix):
                 width="stretch",
                 key=f"{key_prefix}_{figure_id}_{index}",
             )
+            downsampled = figure_payload.get("downsampled")
+            if downsampled:
+                st.caption(
+                    f"Showing {downsampled['points_after']:,} of "
+                    f"{downsampled['points_before']:,} points."
+                )
         except Exception as e:
             st.warning(f"⚠️ Could not load visualization: {e}")
 
@@ -123,7 +130,7 @@ agent_session = st.session_state.agent_session
 with st.sidebar:
     st.header("📤 Upload Data")
     uploaded_file = st.file_uploader(
-        "Choose a CSV/Excel file",
+        "Choose a CSV, Excel, Parquet or Arrow file",
         type=list(SUPPORTED_UPLOAD_TYPES),
         key="sidebar_uploader",
     )
@@ -217,7 +224,10 @@ with tab2:
                     f"🔧 Tool Call #{i + 1}: {item.get('tool', 'unknown')}",
                     expanded=True,
                 ):
-                    st.caption(f"⏰ {item.get('timestamp', 'N/A')}")
+                    caption = f"⏰ {item.get('timestamp', 'N/A')}"
+                    if item.get("duration_ms") is not None:
+                        caption += f" · ⏱️ {item['duration_ms']:.0f} ms"
+                    st.caption(caption)
                     if item.get("code"):
                         st.markdown("**Code Executed:**")
                         st.code(item["code"], language="python")
@@ -231,6 +241,12 @@ with tab2:
                             f"✅ Generated {len(item['figures'])} visualization(s)"
                         )
                         st.json(summarize_figures(item["figures"]))
+            elif item.get("type") == "tool_step" and item.get("tool_calls", 0) > 1:
+                mode = "in parallel" if item.get("parallel") else "sequentially"
+                st.caption(
+                    f"⚡ {item['tool_calls']} tool calls ran {mode} "
+                    f"in {item['duration_ms']:.0f} ms"
+                )
             elif item.get("type") == "ai_message":
                 with st.expander(f"💬 AI Response #{i + 1}", expanded=True):
                     st.caption(f"⏰ {item.get('timestamp', 'N/A')}")
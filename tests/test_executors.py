@@ -0,0 +1,51 @@
+import unittest
+
+import pandas as pd
+
+from agent.executors import WorkerPoolExecutor
+from agent.namespace import ReplNamespace
+
+
+class WorkerPoolNamespaceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = WorkerPoolExecutor(max_workers=1)
+        cls.df = pd.DataFrame({"x": [1.0, 2.0, 3.0, 4.0], "y": [2.0, 4.0, 6.0, 8.0]})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def run_code(self, code, namespace):
+        result = self.executor.execute(code, "test", self.df, namespace)
+        self.assertIsNone(result["error"], result["error"])
+        return result
+
+    def test_in_place_mutation_reaches_next_call(self):
+        namespace = ReplNamespace()
+        self.run_code("items = []\ntable = {}", namespace)
+        self.run_code("items.append(len(df))\ntable['k'] = 1", namespace)
+        result = self.run_code("print(items, table)", namespace)
+        self.assertEqual(result["stdout"].strip(), "[4] {'k': 1}")
+
+    def test_fitted_estimator_persists(self):
+        namespace = ReplNamespace()
+        self.run_code(
+            "from sklearn.linear_model import LinearRegression\n"
+            "model = LinearRegression()",
+            namespace,
+        )
+        self.run_code("model.fit(df[['x']], df['y'])", namespace)
+        result = self.run_code("print(round(float(model.coef_[0]), 3))", namespace)
+        self.assertEqual(result["stdout"].strip(), "2.0")
+
+    def test_unchanged_binding_is_kept(self):
+        namespace = ReplNamespace()
+        self.run_code("items = [1]", namespace)
+        before = namespace.bindings()["items"]
+        self.run_code("print(items)", namespace)
+        self.assertIs(namespace.bindings()["items"], before)
+
+
+if __name__ == "__main__":
+    unittest.main()
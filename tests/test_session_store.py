@@ -0,0 +1,45 @@
+import io
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from agent.datasets import get_dataset_cache
+from agent.service import AgentSession
+from agent.session_store import SQLiteSessionStore
+
+
+def _workbook_bytes() -> bytes:
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        pd.DataFrame({"a": [1, 2, 3]}).to_excel(writer, sheet_name="first", index=False)
+        pd.DataFrame({"b": ["x", "y"]}).to_excel(
+            writer, sheet_name="second", index=False
+        )
+    return buffer.getvalue()
+
+
+class SQLiteSessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_workbook_sheets_survive_rehydration(self):
+        writer = SQLiteSessionStore(directory=self.directory)
+        session = AgentSession()
+        session.load_uploaded_file(_workbook_bytes(), "book.xlsx")
+        writer.put("s", session)
+
+        # Another worker: nothing cached in this process.
+        get_dataset_cache().clear()
+        reader = SQLiteSessionStore(directory=self.directory)
+        restored = reader.get("s")
+
+        self.assertEqual(list(restored.df.columns), ["a"])
+        self.assertEqual(list(restored.sheets), ["first", "second"])
+        self.assertEqual(restored.sheets["second"]["b"].tolist(), ["x", "y"])
+
+
+if __name__ == "__main__":
+    unittest.main()